@@ -3,6 +3,11 @@ ASGI config for avito project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Потоки сообщений чатов (chats.views.message_stream) держат соединение
+открытым, поэтому приложение запускается ASGI-сервером: runserver из
+daphne (приложение daphne в INSTALLED_APPS) или ``daphne avito.asgi:application``.
+Под WSGI поток отвечает 204, и страница чата опрашивает сервер.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
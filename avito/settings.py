@@ -35,6 +35,8 @@ ALLOWED_HOSTS = []
 # Application definition
 
 INSTALLED_APPS = [
+    # ASGI-версия runserver: потоки чатов (SSE) не занимают воркер
+    'daphne',
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
@@ -83,6 +85,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'avito.wsgi.application'
+ASGI_APPLICATION = 'avito.asgi.application'
 
 
 # Database
@@ -149,6 +152,35 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 SESSION_COOKIE_AGE = 86400 # хранение 30 дней
 SESSION_SAVE_EVERY_REQUEST = True
 
+# Корзины анонимных посетителей хранятся в кэше ('cache') и переносятся
+# в БД при входе или оформлении заказа; 'db' — хранить сразу в БД.
+# Кэш корзин должен быть общим для всех процессов (файлы, Redis, Memcached).
+CART_ANONYMOUS_STORAGE = os.getenv('CART_ANONYMOUS_STORAGE', 'cache')
+CART_CACHE_ALIAS = 'carts'
+
+# Сколько секунд товар в корзине зарезервирован за покупателем
+CART_RESERVATION_TTL = 15 * 60
+
+# Доставка новых сообщений в потоки чатов (SSE) через LISTEN/NOTIFY, чтобы
+# события доходили до всех процессов. InProcessBroker подходит только для
+# одного процесса (локальная разработка без PostgreSQL)
+CHAT_PUBSUB_BACKEND = os.getenv('CHAT_PUBSUB_BACKEND', 'chats.pubsub.PostgresBroker')
+
+# Кэш по умолчанию общий для всех процессов сервера: в нем версия
+# счетчиков фильтров и другие данные, которые сбрасываются сигналами.
+# При нескольких серверах — Redis или Memcached.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache', 'default'),
+    },
+    'carts': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache', 'carts'),
+        'TIMEOUT': SESSION_COOKIE_AGE,
+    },
+}
+
 CSRF_COOKIE_SECURE = True
 SESSION_COOKIE_SECURE = True
 SECURE_BROWSER_XSS_FILTER = True
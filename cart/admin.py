@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Cart, CartItem
+from .models import Cart, CartItem, StockReservation
 
 
 class CartItemInline(admin.TabularInline):
@@ -22,4 +22,12 @@ class CartItemAdmin(admin.ModelAdmin):
     list_display = ('cart', 'product', 'product_size', 'quantity', 'added_at')
     list_filter = ('added_at',)
     search_fields = ('product__name', 'cart__session_key')
-    readonly_fields = ('cart', 'product', 'product_size', 'added_at')
\ No newline at end of file
+    readonly_fields = ('cart', 'product', 'product_size', 'added_at')
+
+
+@admin.register(StockReservation)
+class StockReservationAdmin(admin.ModelAdmin):
+    list_display = ('cart_key', 'product_size', 'quantity', 'expires_at', 'created_at')
+    list_filter = ('expires_at',)
+    search_fields = ('cart_key', 'product_size__product__name')
+    readonly_fields = ('cart_key', 'product_size', 'quantity', 'expires_at', 'created_at')
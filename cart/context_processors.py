@@ -1,15 +1,11 @@
-from .models import Cart
+from django.utils.functional import SimpleLazyObject
+from .storage import get_cart
 
 
 def cart_processor(request):
-    if not request.session.session_key:
-        request.session.create()
-
-    cart, created = Cart.objects.get_or_create(
-        session_key=request.session.session_key
-    )
-
+    # Корзина читается из БД, только если шаблон действительно
+    # обращается к счетчику
     return {
-        'cart_total_items': cart.total_items,
+        'cart_total_items': SimpleLazyObject(lambda: get_cart(request).total_items),
         'cart_subtotal': 0,
-    }
\ No newline at end of file
+    }
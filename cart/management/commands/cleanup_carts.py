@@ -0,0 +1,78 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from cart.models import Cart, CartItem, StockReservation
+
+
+class Command(BaseCommand):
+    help = ('Удалить истекшие сессии и брошенные корзины небольшими пачками, '
+            'чтобы команду можно было запускать под нагрузкой')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Количество строк, удаляемых за один запрос')
+        parser.add_argument('--max-seconds', type=float, default=300,
+                            help='Ограничение времени работы команды')
+        parser.add_argument('--cart-age-days', type=int, default=30,
+                            help='Удалять корзины, не изменявшиеся дольше этого срока')
+        parser.add_argument('--pause', type=float, default=0,
+                            help='Пауза между пачками в секундах')
+
+    def handle(self, *args, **options):
+        self.batch_size = options['batch_size']
+        self.pause = options['pause']
+        self.deadline = time.monotonic() + options['max_seconds']
+        self.verbose = options['verbosity'] > 1
+        now = timezone.now()
+
+        uses_db_sessions = settings.SESSION_ENGINE in (
+            'django.contrib.sessions.backends.db',
+            'django.contrib.sessions.backends.cached_db',
+        )
+
+        if uses_db_sessions:
+            self.prune('сессии', Session.objects.filter(expire_date__lt=now), 'session_key')
+
+        stale_carts = Q(updated_at__lt=now - timedelta(days=options['cart_age_days']))
+        if uses_db_sessions:
+            stale_carts |= ~Q(Exists(Session.objects.filter(
+                session_key=OuterRef('session_key'), expire_date__gte=now
+            )))
+        self.prune('корзины', Cart.objects.filter(stale_carts), 'id', delete=self.delete_carts)
+
+    def out_of_time(self):
+        return time.monotonic() >= self.deadline
+
+    def delete_carts(self, ids):
+        StockReservation.objects.filter(cart_key__in=[f'cart:{pk}' for pk in ids]).delete()
+        CartItem.objects.filter(cart_id__in=ids).delete()
+        return Cart.objects.filter(id__in=ids).delete()[0]
+
+    def prune(self, label, queryset, key, delete=None):
+        deleted = 0
+        while not self.out_of_time():
+            ids = list(queryset.order_by(key).values_list(key, flat=True)[:self.batch_size])
+            if not ids:
+                break
+            if delete is None:
+                deleted += queryset.model.objects.filter(**{f'{key}__in': ids}).delete()[0]
+            else:
+                deleted += delete(ids)
+            if self.verbose:
+                self.stdout.write(f'{label}: удалено {deleted}')
+            if self.pause:
+                time.sleep(self.pause)
+
+        if self.out_of_time():
+            self.stdout.write(self.style.WARNING(
+                f'{label}: удалено {deleted}, остановлено по ограничению времени'
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'{label}: удалено {deleted}'))
+        return deleted
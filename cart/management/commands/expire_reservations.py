@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from cart.reservations import expire_reservations
+
+
+class Command(BaseCommand):
+    help = 'Удалить истекшие резервы товаров в корзинах небольшими пачками'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Количество строк, удаляемых за один запрос')
+        parser.add_argument('--max-seconds', type=float, default=60,
+                            help='Ограничение времени работы команды')
+        parser.add_argument('--pause', type=float, default=0,
+                            help='Пауза между пачками в секундах')
+
+    def handle(self, *args, **options):
+        deadline = time.monotonic() + options['max_seconds']
+        deleted = 0
+        while time.monotonic() < deadline:
+            count = expire_reservations(options['batch_size'])
+            if not count:
+                break
+            deleted += count
+            if options['verbosity'] > 1:
+                self.stdout.write(f'Удалено резервов: {deleted}')
+            if options['pause']:
+                time.sleep(options['pause'])
+
+        self.stdout.write(self.style.SUCCESS(f'Удалено истекших резервов: {deleted}'))
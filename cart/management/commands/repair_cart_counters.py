@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from cart.models import Cart, recount_item_counts
+
+
+class Command(BaseCommand):
+    help = 'Пересчитать счетчики товаров в корзинах по позициям'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help='Количество корзин в одном UPDATE')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        last_id = 0
+        repaired = 0
+        while True:
+            ids = list(
+                Cart.objects.filter(id__gt=last_id)
+                .order_by('id')
+                .values_list('id', flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+            repaired += recount_item_counts(Cart.objects.filter(id__in=ids))
+            last_id = ids[-1]
+            if options['verbosity'] > 1:
+                self.stdout.write(f'Обработано корзин: {repaired}')
+
+        self.stdout.write(self.style.SUCCESS(f'Счетчики пересчитаны, корзин: {repaired}'))
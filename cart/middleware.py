@@ -1,13 +1,9 @@
 from django.utils.deprecation import MiddlewareMixin
-from .models import Cart
+from django.utils.functional import SimpleLazyObject
+from .storage import get_cart
 
 
 class CartMiddleware(MiddlewareMixin):
     def process_request(self, request):
-        if not request.session.session_key:
-            request.session.create()
-
-        request.cart, created = Cart.objects.get_or_create(
-            session_key=request.session.session_key
-        )
-        return None
\ No newline at end of file
+        request.cart = SimpleLazyObject(lambda: get_cart(request))
+        return None
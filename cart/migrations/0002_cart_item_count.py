@@ -0,0 +1,33 @@
+# Generated by Django 5.2.7 on 2026-10-18 05:31
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def backfill_item_count(apps, schema_editor):
+    Cart = apps.get_model('cart', 'Cart')
+    CartItem = apps.get_model('cart', 'CartItem')
+    totals = (
+        CartItem.objects.filter(cart=OuterRef('pk'))
+        .values('cart')
+        .annotate(total=Sum('quantity'))
+        .values('total')
+    )
+    Cart.objects.update(item_count=Coalesce(Subquery(totals), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cart', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cart',
+            name='item_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_item_count, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.7 on 2026-10-18 05:36
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cart', '0002_cart_item_count'),
+        ('main', '0010_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockReservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cart_key', models.CharField(max_length=64)),
+                ('quantity', models.PositiveIntegerField()),
+                ('expires_at', models.DateTimeField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('product_size', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservations', to='main.productsize')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['product_size', 'expires_at'], name='reservation_size_expires_idx'), models.Index(fields=['expires_at'], name='reservation_expires_idx')],
+                'unique_together': {('cart_key', 'product_size')},
+            },
+        ),
+    ]
@@ -1,4 +1,7 @@
 from django.db import models
+from django.db.models import F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
 from django.contrib.sessions.models import Session
 from main.models import Product, ProductSize
 from decimal import Decimal
@@ -6,6 +9,7 @@ from decimal import Decimal
 
 class Cart(models.Model):
     session_key = models.CharField(max_length=40, unique=True)
+    item_count = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -14,9 +18,58 @@ class Cart(models.Model):
         return f"Cart {self.session_key}"
     
 
+    @property
+    def reservation_key(self):
+        return f'cart:{self.pk}'
+    
+
+    @property
+    def existing_reservation_key(self):
+        """Ключ резервов, если корзина уже сохранена, иначе None"""
+        return self.reservation_key if self.pk is not None else None
+    
+
     @property
     def total_items(self):
-        return sum(item.quantity for item in self.items.all())
+        return self.item_count
+    
+
+    @property
+    def subtotal(self):
+        # У товаров нет цены (поле удалено в main 0002), сумма всегда ноль
+        return Decimal('0')
+    
+
+    def get_items(self):
+        """Позиции корзины для отображения"""
+        if self.pk is None:
+            return CartItem.objects.none()
+        return self.items.select_related(
+            'product',
+            'product_size__size'
+        ).order_by('-added_at')
+    
+
+    def get_item(self, item_id):
+        if self.pk is None:
+            return None
+        return self.items.select_related('product', 'product_size').filter(id=item_id).first()
+    
+
+    def find_item(self, product_size):
+        if self.pk is None:
+            return None
+        return self.items.filter(product_size=product_size).first()
+    
+
+    def _change_item_count(self, delta):
+        """Атомарно изменить счетчик товаров и обновить его в объекте"""
+        if delta:
+            Cart.objects.filter(pk=self.pk).update(
+                item_count=Greatest(F('item_count') + delta, 0),
+                updated_at=timezone.now(),
+            )
+            self.refresh_from_db(fields=['item_count', 'updated_at'])
     
 
     def add_product(self, product, product_size, quantity=1):
@@ -28,16 +81,22 @@ class Cart(models.Model):
         )
 
         if not created:
-            cart_item.quantity += quantity
-            cart_item.save()
+            CartItem.objects.filter(pk=cart_item.pk).update(
+                quantity=F('quantity') + quantity
+            )
+            cart_item.refresh_from_db(fields=['quantity'])
 
+        self._change_item_count(quantity)
         return cart_item
     
 
     def remove_item(self, item_id):
+        if self.pk is None:
+            return False
         try:
             item = self.items.get(id=item_id)
             item.delete()
+            self._change_item_count(-item.quantity)
             return True
         except CartItem.DoesNotExist:
             return False
@@ -45,19 +104,25 @@ class Cart(models.Model):
     
     def update_item_quantity(self, item_id, quantity):
         try:
-            item = self.items.get(id=item_id)
+            item = self.items.select_for_update().get(id=item_id)
             if quantity > 0:
+                delta = quantity - item.quantity
                 item.quantity = quantity
-                item.sav()
+                item.save(update_fields=['quantity'])
             else:
+                delta = -item.quantity
                 item.delete()
+            self._change_item_count(delta)
             return True
         except CartItem.DoesNotExist:
             return False
         
     
     def clear(self):
-        self.items.all().delete()
+        if self.pk is not None:
+            self.items.all().delete()
+            Cart.objects.filter(pk=self.pk).update(item_count=0, updated_at=timezone.now())
+            self.item_count = 0
 
 
 class CartItem(models.Model):
@@ -74,5 +139,39 @@ class CartItem(models.Model):
     
     def __str__(self):
         return f"{self.product.name} - {self.product_size.size.name} x {self.quantity}"
-    
 
+
+class StockReservation(models.Model):
+    """Временный резерв остатка размера товара под корзину.
+
+    Корзина определяется строкой cart_key (см. reservation_key у Cart и
+    CacheCart), поэтому резервы работают и для корзин в кэше.
+    """
+    cart_key = models.CharField(max_length=64)
+    product_size = models.ForeignKey(ProductSize, related_name='reservations', on_delete=models.CASCADE)
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+
+    class Meta:
+        unique_together = ('cart_key', 'product_size')
+        indexes = [
+            models.Index(fields=['product_size', 'expires_at'], name='reservation_size_expires_idx'),
+            models.Index(fields=['expires_at'], name='reservation_expires_idx'),
+        ]
+
+
+    def __str__(self):
+        return f"{self.cart_key}: {self.product_size_id} x {self.quantity}"
+
+
+def recount_item_counts(carts):
+    """Пересчитать item_count для набора корзин одним UPDATE"""
+    totals = (
+        CartItem.objects.filter(cart=OuterRef('pk'))
+        .values('cart')
+        .annotate(total=Sum('quantity'))
+        .values('total')
+    )
+    return carts.update(item_count=Coalesce(Subquery(totals), 0))
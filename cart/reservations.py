@@ -0,0 +1,163 @@
+"""Временное резервирование остатков под корзины.
+
+Свободный остаток размера — это stock минус сумма действующих (не
+истекших) резервов других корзин. Резерв продлевается при каждом
+изменении корзины и превращается в позиции заказа при оформлении.
+Истекшие строки не учитываются и удаляются командой expire_reservations.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from main.models import ProductSize
+from .models import StockReservation
+
+
+class ReservationError(ValueError):
+    """Свободного остатка меньше, чем запрошено"""
+
+    def __init__(self, available):
+        self.available = available
+        super().__init__(f'Only {available} items available')
+
+
+def reservation_ttl():
+    return timedelta(seconds=getattr(settings, 'CART_RESERVATION_TTL', 15 * 60))
+
+
+def live_reservations(exclude_key=None):
+    reservations = StockReservation.objects.filter(expires_at__gt=timezone.now())
+    if exclude_key is not None:
+        reservations = reservations.exclude(cart_key=exclude_key)
+    return reservations
+
+
+def reserved_quantities(size_ids, exclude_key=None):
+    """Количество, зарезервированное другими корзинами, по id размеров"""
+    return dict(
+        live_reservations(exclude_key)
+        .filter(product_size_id__in=size_ids)
+        .order_by()
+        .values('product_size')
+        .annotate(total=Sum('quantity'))
+        .values_list('product_size', 'total')
+    )
+
+
+def with_available_stock(queryset, exclude_key=None):
+    """Добавить к queryset размеров аннотацию available_stock"""
+    reserved = (
+        live_reservations(exclude_key)
+        .filter(product_size=OuterRef('pk'))
+        .order_by()
+        .values('product_size')
+        .annotate(total=Sum('quantity'))
+        .values('total')
+    )
+    return queryset.annotate(
+        available_stock=F('stock') - Coalesce(Subquery(reserved), 0)
+    )
+
+
+def reserve(cart_key, product_size, quantity):
+    """Зарезервировать quantity единиц размера под корзину.
+
+    quantity — итоговое количество в корзине, а не прибавка. Строка
+    размера блокируется, чтобы параллельные резервы не превысили остаток.
+    Все резервы корзины при этом продлеваются. Возвращает свободный
+    остаток для этой корзины, при нехватке бросает ReservationError.
+    """
+    if quantity <= 0:
+        release(cart_key, product_size.id)
+        return None
+
+    with transaction.atomic():
+        stock = ProductSize.objects.select_for_update().values_list(
+            'stock', flat=True
+        ).get(pk=product_size.pk)
+        available = stock - reserved_quantities([product_size.pk], cart_key).get(product_size.pk, 0)
+        if quantity > available:
+            raise ReservationError(max(available, 0))
+
+        expires_at = timezone.now() + reservation_ttl()
+        StockReservation.objects.update_or_create(
+            cart_key=cart_key,
+            product_size_id=product_size.pk,
+            defaults={'quantity': quantity, 'expires_at': expires_at},
+        )
+        StockReservation.objects.filter(cart_key=cart_key).update(expires_at=expires_at)
+    return available
+
+
+def release(cart_key, product_size_id=None):
+    """Снять резервы корзины (все или по одному размеру)"""
+    if cart_key is None:
+        return 0
+    reservations = StockReservation.objects.filter(cart_key=cart_key)
+    if product_size_id is not None:
+        reservations = reservations.filter(product_size_id=product_size_id)
+    return reservations.delete()[0]
+
+
+def transfer_reservations(old_key, new_key):
+    """Перенести резервы на другую корзину (при переносе корзины из кэша в БД).
+
+    Количества складываются с резервами новой корзины, но не больше
+    свободного остатка: строки размеров блокируются, как в reserve.
+    """
+    if old_key is None or old_key == new_key:
+        return
+    with transaction.atomic():
+        moved = dict(
+            StockReservation.objects.filter(cart_key=old_key)
+            .values_list('product_size_id', 'quantity')
+        )
+        if not moved:
+            return
+        stock = dict(
+            ProductSize.objects.select_for_update().filter(id__in=moved)
+            .order_by('id').values_list('id', 'stock')
+        )
+        existing = dict(
+            StockReservation.objects.filter(cart_key=new_key, product_size_id__in=moved)
+            .values_list('product_size_id', 'quantity')
+        )
+        reserved_by_others = dict(
+            live_reservations()
+            .filter(product_size_id__in=moved)
+            .exclude(cart_key__in=[old_key, new_key])
+            .order_by()
+            .values('product_size')
+            .annotate(total=Sum('quantity'))
+            .values_list('product_size', 'total')
+        )
+
+        expires_at = timezone.now() + reservation_ttl()
+        for size_id, quantity in moved.items():
+            available = stock.get(size_id, 0) - reserved_by_others.get(size_id, 0)
+            quantity = min(existing.get(size_id, 0) + quantity, available)
+            if quantity > 0:
+                StockReservation.objects.update_or_create(
+                    cart_key=new_key,
+                    product_size_id=size_id,
+                    defaults={'quantity': quantity, 'expires_at': expires_at},
+                )
+            else:
+                release(new_key, size_id)
+        release(old_key)
+
+
+def expire_reservations(batch_size=1000):
+    """Удалить одну пачку истекших резервов, вернуть количество удаленных"""
+    ids = list(
+        StockReservation.objects.filter(expires_at__lte=timezone.now())
+        .order_by('expires_at')
+        .values_list('id', flat=True)[:batch_size]
+    )
+    if not ids:
+        return 0
+    return StockReservation.objects.filter(id__in=ids).delete()[0]
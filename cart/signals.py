@@ -0,0 +1,10 @@
+from django.contrib.auth.signals import user_logged_in
+from django.dispatch import receiver
+
+from .storage import promote_cart
+
+
+@receiver(user_logged_in)
+def promote_anonymous_cart(sender, request, user, **kwargs):
+    if request is not None:
+        promote_cart(request)
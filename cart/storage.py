@@ -0,0 +1,214 @@
+"""Хранилище корзин анонимных посетителей.
+
+Пока посетитель не вошел в систему, его корзина живет в кэше Django и не
+создает строк в таблице cart_cart. В БД она переносится при входе или
+оформлении заказа (см. promote_cart).
+"""
+import uuid
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+from django.utils.functional import SimpleLazyObject
+
+from main.models import ProductSize
+from .models import Cart, CartItem
+from .reservations import transfer_reservations
+
+
+CART_TOKEN_SESSION_KEY = 'cart_token'
+
+
+class CacheCart:
+    """Корзина в кэше с тем же интерфейсом, что и cart.models.Cart.
+
+    Идентификатором позиции служит id размера товара, поэтому ссылки
+    на изменение и удаление позиций работают без изменений.
+    """
+    pk = id = None
+
+    def __init__(self, request):
+        self.request = request
+        self.token = request.session.get(CART_TOKEN_SESSION_KEY)
+        self._data = None
+
+    @property
+    def cache(self):
+        return caches[getattr(settings, 'CART_CACHE_ALIAS', 'default')]
+
+    @property
+    def cache_key(self):
+        return f'cart:{self.token}'
+
+    def _load(self):
+        if self._data is None:
+            self._data = (self.cache.get(self.cache_key) if self.token else None) or {}
+        return self._data
+
+    @property
+    def reservation_key(self):
+        self._ensure_token()
+        return f'anon:{self.token}'
+
+    @property
+    def existing_reservation_key(self):
+        """Ключ резервов без создания токена (для чтения и снятия резервов)"""
+        return f'anon:{self.token}' if self.token else None
+
+    def _ensure_token(self):
+        if not self.token:
+            self.token = uuid.uuid4().hex
+            self.request.session[CART_TOKEN_SESSION_KEY] = self.token
+
+    def _save(self):
+        self._ensure_token()
+        self.cache.set(self.cache_key, self._data, settings.SESSION_COOKIE_AGE)
+
+    @property
+    def item_count(self):
+        return sum(entry['quantity'] for entry in self._load().values())
+
+    @property
+    def total_items(self):
+        return self.item_count
+
+    @property
+    def subtotal(self):
+        return Decimal('0')
+
+    def _build_items(self, size_ids):
+        data = self._load()
+        sizes = ProductSize.objects.select_related('product', 'size').in_bulk(size_ids)
+        items = []
+        for size_id in size_ids:
+            product_size = sizes.get(size_id)
+            if product_size is None:
+                continue
+            item = CartItem(
+                id=product_size.id,
+                product=product_size.product,
+                product_size=product_size,
+                quantity=data[size_id]['quantity'],
+            )
+            item.added_at = data[size_id]['added_at']
+            items.append(item)
+        return items
+
+    def get_items(self):
+        items = self._build_items(list(self._load()))
+        return sorted(items, key=lambda item: item.added_at, reverse=True)
+
+    def get_item(self, item_id):
+        if item_id not in self._load():
+            return None
+        items = self._build_items([item_id])
+        return items[0] if items else None
+
+    def find_item(self, product_size):
+        return self.get_item(product_size.id)
+
+    def add_product(self, product, product_size, quantity=1):
+        data = self._load()
+        entry = data.setdefault(product_size.id, {
+            'quantity': 0,
+            'added_at': timezone.now(),
+        })
+        entry['quantity'] += quantity
+        self._save()
+
+        item = CartItem(id=product_size.id, product=product,
+                        product_size=product_size, quantity=entry['quantity'])
+        item.added_at = entry['added_at']
+        return item
+
+    def remove_item(self, item_id):
+        if self._load().pop(item_id, None) is None:
+            return False
+        self._save()
+        return True
+
+    def update_item_quantity(self, item_id, quantity):
+        data = self._load()
+        if item_id not in data:
+            return False
+        if quantity > 0:
+            data[item_id]['quantity'] = quantity
+        else:
+            del data[item_id]
+        self._save()
+        return True
+
+    def clear(self):
+        self._data = {}
+        if self.token:
+            self.cache.delete(self.cache_key)
+
+    def delete(self):
+        self.clear()
+        self.request.session.pop(CART_TOKEN_SESSION_KEY, None)
+        self.token = None
+
+
+def get_cart(request):
+    """Корзина текущего запроса, загружается один раз за запрос.
+
+    Анонимные посетители получают корзину в кэше (если не выбрано
+    CART_ANONYMOUS_STORAGE = 'db'), остальные — корзину сессии в БД.
+    Если строки в БД еще нет, возвращается несохраненный объект — она
+    создается только при первом изменении (см. create_db_cart).
+    """
+    if not hasattr(request, '_cached_cart'):
+        storage = getattr(settings, 'CART_ANONYMOUS_STORAGE', 'cache')
+        user = getattr(request, 'user', None)
+        if storage == 'cache' and not (user and user.is_authenticated):
+            request._cached_cart = CacheCart(request)
+        else:
+            cart = None
+            session_key = request.session.session_key
+            if session_key:
+                cart = Cart.objects.filter(session_key=session_key).first()
+            request._cached_cart = cart or Cart(session_key=session_key or '')
+    return request._cached_cart
+
+
+def reset_cart(request):
+    """Сбросить корзину запроса, чтобы она была загружена заново"""
+    if hasattr(request, '_cached_cart'):
+        del request._cached_cart
+    request.cart = SimpleLazyObject(lambda: get_cart(request))
+
+
+def create_db_cart(request):
+    """Корзина текущей сессии в БД, созданная при необходимости"""
+    if not request.session.session_key:
+        request.session.create()
+
+    cart, created = Cart.objects.get_or_create(
+        session_key=request.session.session_key
+    )
+
+    request._cached_cart = cart
+    request.cart = cart
+    return cart
+
+
+def promote_cart(request):
+    """Перенести корзину из кэша в БД (при входе или оформлении заказа)"""
+    reset_cart(request)
+    if not request.session.get(CART_TOKEN_SESSION_KEY):
+        return None
+
+    anonymous_cart = CacheCart(request)
+    anonymous_key = anonymous_cart.existing_reservation_key
+    items = anonymous_cart.get_items()
+    anonymous_cart.delete()
+
+    if not items:
+        return None
+
+    cart = create_db_cart(request)
+    for item in reversed(items):
+        cart.add_product(item.product, item.product_size, item.quantity)
+    transfer_reservations(anonymous_key, cart.reservation_key)
+    return cart
@@ -1,5 +1,5 @@
 from django import template
-from cart.models import Cart
+from cart.storage import get_cart
 
 
 register = template.Library()
@@ -7,15 +7,7 @@ register = template.Library()
 
 @register.simple_tag(takes_context=True)
 def get_cart_count(context):
-    request = context['request']
-    if not request.session.session_key:
-        return 0
-    
-    try:
-        cart = Cart.objects.get(session_key=request.session.session_key)
-        return cart.total_items
-    except Cart.DoesNotExist:
-        return 0
+    return get_cart(context['request']).total_items
     
 
 @register.filter
@@ -1,3 +1,187 @@
-from django.test import TestCase
+from datetime import timedelta
+from io import StringIO
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.contrib.sessions.models import Session
+from django.core.management import call_command
+from django.db.models import Sum
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from main.models import Category, Product, ProductSize, Size
+from .models import Cart, CartItem, StockReservation
+from .reservations import reserve, transfer_reservations, with_available_stock
+from .storage import CART_TOKEN_SESSION_KEY, CacheCart
+
+
+class ReservationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        product = Product.objects.create(
+            name='Сумка', category=Category.objects.create(name='Сумки'), total_stock=3
+        )
+        cls.size = ProductSize.objects.create(
+            product=product, size=Size.objects.create(name='One Size'), stock=3
+        )
+
+    def reserved(self, cart_key):
+        return StockReservation.objects.get(cart_key=cart_key, product_size=self.size).quantity
+
+    def test_own_reservation_stays_available(self):
+        reserve('cart:1', self.size, 3)
+        sizes = ProductSize.objects.filter(pk=self.size.pk)
+        self.assertEqual(with_available_stock(sizes).get().available_stock, 0)
+        self.assertEqual(with_available_stock(sizes, exclude_key='cart:1').get().available_stock, 3)
+
+    def test_transfer_merges_up_to_available_stock(self):
+        reserve('cart:other', self.size, 1)
+        reserve('anon:token', self.size, 1)
+        reserve('cart:1', self.size, 1)
+        # Пока корзина была анонимной, одну единицу продали
+        ProductSize.objects.filter(pk=self.size.pk).update(stock=2)
+        transfer_reservations('anon:token', 'cart:1')
+
+        self.assertEqual(self.reserved('cart:1'), 1)
+        self.assertFalse(StockReservation.objects.filter(cart_key='anon:token').exists())
+
+    def test_reading_anonymous_key_does_not_create_token(self):
+        request = RequestFactory().get('/')
+        request.session = {}
+        cart = CacheCart(request)
+
+        self.assertIsNone(cart.existing_reservation_key)
+        self.assertNotIn(CART_TOKEN_SESSION_KEY, request.session)
+
+
+class ItemCountTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.product = Product.objects.create(
+            name='Кеды', category=Category.objects.create(name='Обувь'), total_stock=10
+        )
+        cls.size_s = ProductSize.objects.create(
+            product=cls.product, size=Size.objects.create(name='S'), stock=5
+        )
+        cls.size_m = ProductSize.objects.create(
+            product=cls.product, size=Size.objects.create(name='M'), stock=5
+        )
+
+    def setUp(self):
+        self.cart = Cart.objects.create(session_key='session')
+
+    def assertCountMatchesItems(self, expected):
+        stored = Cart.objects.get(pk=self.cart.pk).item_count
+        total = self.cart.items.aggregate(total=Sum('quantity'))['total'] or 0
+        self.assertEqual((self.cart.item_count, stored, total), (expected, expected, expected))
+
+    def test_changes_keep_count_in_sync(self):
+        self.cart.add_product(self.product, self.size_s, 2)
+        item = self.cart.add_product(self.product, self.size_s, 1)
+        self.cart.add_product(self.product, self.size_m, 1)
+        self.assertCountMatchesItems(4)
+
+        self.cart.update_item_quantity(item.id, 1)
+        self.assertCountMatchesItems(2)
+
+        self.cart.remove_item(item.id)
+        self.assertCountMatchesItems(1)
+
+        self.cart.clear()
+        self.assertCountMatchesItems(0)
+
+    def test_repair_command_fixes_drifted_counter(self):
+        self.cart.add_product(self.product, self.size_s, 3)
+        empty = Cart.objects.create(session_key='empty')
+        Cart.objects.update(item_count=7)
+        call_command('repair_cart_counters', batch_size=1, stdout=StringIO())
+
+        self.assertEqual(Cart.objects.get(pk=self.cart.pk).item_count, 3)
+        self.assertEqual(Cart.objects.get(pk=empty.pk).item_count, 0)
+
+
+LOCMEM_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'default'},
+    'carts': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'carts'},
+}
+
+
+@override_settings(CACHES=LOCMEM_CACHES, CART_ANONYMOUS_STORAGE='cache')
+class AnonymousCartTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.product = Product.objects.create(
+            name='Куртка', category=Category.objects.create(name='Одежда'),
+            total_stock=5, is_approved=True
+        )
+        cls.size = ProductSize.objects.create(
+            product=cls.product, size=Size.objects.create(name='L'), stock=5
+        )
+        cls.user = get_user_model().objects.create_user(
+            'buyer@example.com', 'Иван', 'Петров', password='x'
+        )
+
+    def add_to_cart(self, quantity):
+        return self.client.post(reverse('cart:add_to_cart', args=[self.product.slug]),
+                                {'size_id': self.size.id, 'quantity': quantity})
+
+    def reserved_keys(self):
+        return list(StockReservation.objects.values_list('cart_key', flat=True))
+
+    def test_anonymous_changes_do_not_touch_cart_table(self):
+        self.assertEqual(self.add_to_cart(2).json()['total_items'], 2)
+        self.client.post(reverse('cart:update_item', args=[self.size.id]), {'quantity': 3})
+        self.assertEqual(self.client.get(reverse('cart:cart_count')).json()['total_items'], 3)
+        self.client.post(reverse('cart:remove_item', args=[self.size.id]))
+
+        self.assertEqual(self.client.get(reverse('cart:cart_count')).json()['total_items'], 0)
+        self.assertFalse(Cart.objects.exists())
+
+    def test_login_promotes_cached_items(self):
+        self.add_to_cart(2)
+        self.client.force_login(self.user)
+
+        cart = Cart.objects.get(session_key=self.client.session.session_key)
+        self.assertEqual([(item.product_size_id, item.quantity) for item in cart.items.all()],
+                         [(self.size.id, 2)])
+        self.assertEqual(cart.item_count, 2)
+        self.assertEqual(self.reserved_keys(), [cart.reservation_key])
+        self.assertNotIn(CART_TOKEN_SESSION_KEY, self.client.session)
+
+
+@override_settings(SESSION_ENGINE='django.contrib.sessions.backends.db')
+class CleanupCartsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        product = Product.objects.create(
+            name='Шарф', category=Category.objects.create(name='Аксессуары'), total_stock=10
+        )
+        cls.size = ProductSize.objects.create(
+            product=product, size=Size.objects.create(name='One Size'), stock=10
+        )
+        now = timezone.now()
+        for session_key in ('live', 'live-2', 'live-aged'):
+            Session.objects.create(session_key=session_key, session_data='',
+                                   expire_date=now + timedelta(days=1))
+        Session.objects.create(session_key='expired', session_data='',
+                               expire_date=now - timedelta(days=1))
+
+        cls.carts = {}
+        for name, session_key in [('live', 'live'), ('live-2', 'live-2'), ('aged', 'live-aged'),
+                                  ('expired', 'expired'), ('orphan', 'missing')]:
+            cart = Cart.objects.create(session_key=session_key)
+            cart.add_product(product, cls.size, 1)
+            reserve(cart.reservation_key, cls.size, 1)
+            cls.carts[name] = cart
+        Cart.objects.filter(pk=cls.carts['aged'].pk).update(updated_at=now - timedelta(days=31))
+
+    def test_removes_stale_carts_in_batches(self):
+        call_command('cleanup_carts', batch_size=1, stdout=StringIO())
+
+        survivors = {self.carts['live'].pk, self.carts['live-2'].pk}
+        self.assertEqual(set(Cart.objects.values_list('id', flat=True)), survivors)
+        self.assertEqual(set(CartItem.objects.values_list('cart_id', flat=True)), survivors)
+        self.assertEqual(set(StockReservation.objects.values_list('cart_key', flat=True)),
+                         {f'cart:{pk}' for pk in survivors})
+        self.assertEqual(set(Session.objects.values_list('session_key', flat=True)),
+                         {'live', 'live-aged', 'live-2'})
@@ -1,29 +1,28 @@
 from django.shortcuts import get_object_or_404, redirect
 from django.views.generic import View
-from django.http import JsonResponse, HttpResponse
+from django.http import Http404, JsonResponse, HttpResponse
 from django.template.response import TemplateResponse
 from django.contrib import messages
 from django.db import transaction
 from main.models import Product, ProductSize
 from .models import Cart, CartItem
 from .forms import AddToCartForm
+from .reservations import ReservationError, release, reserve
+from .storage import create_db_cart, get_cart
 import json
 
 
 class CartMixin:
-    def get_cart(self, request):
-        if hasattr(request, 'cart'):
-            return request.cart
-    
-        if not request.session.session_key:
-            request.session.create()
-
-        cart, created = Cart.objects.get_or_create(
-            session_key=request.session.session_key
-        )
-
-        request.session['cart_id'] = cart.id
-        request.session.modified = True
+    def get_cart(self, request, create=False):
+        """Корзина запроса; с create=True строка в БД создается при отсутствии.
+
+        Корзины анонимных посетителей в кэше создаются при первой записи сами.
+        """
+        cart = get_cart(request)
+        if create and isinstance(cart, Cart) and cart.pk is None:
+            cart = create_db_cart(request)
+            request.session['cart_id'] = cart.id
+            request.session.modified = True
         return cart
     
 
@@ -32,10 +31,7 @@ class CartModalView(CartMixin, View):
         cart = self.get_cart(request)
         context = {
             'cart': cart,
-            'cart_items': cart.items.select_related(
-                'product',
-                'product_size__size'
-            ).order_by('-added_at')
+            'cart_items': cart.get_items()
         }
         return TemplateResponse(request, 'cart/cart_modal.html', context)
 
@@ -43,7 +39,7 @@ class CartModalView(CartMixin, View):
 class AddToCartView(CartMixin, View):
     @transaction.atomic
     def post(self, request, slug):
-        cart = self.get_cart(request)
+        cart = self.get_cart(request, create=True)
         product = get_object_or_404(Product, slug=slug)
 
         form = AddToCartForm(request.POST, product=product)
@@ -69,22 +65,19 @@ class AddToCartView(CartMixin, View):
                 }, status=400)
 
         quantity = form.cleaned_data['quantity']
-        if product_size.stock < quantity:
-            return JsonResponse({
-                'error': f'Only {product_size.stock} items available'
-            }, status=400)
-
-        existing_item = cart.items.filter(
-            product=product,
-            product_size=product_size,
-        ).first()
+        existing_item = cart.find_item(product_size)
+        in_cart = existing_item.quantity if existing_item else 0
 
-        if existing_item:
-            total_quantity = existing_item.quantity + quantity
-            if total_quantity > product_size.stock:
+        try:
+            reserve(cart.reservation_key, product_size, in_cart + quantity)
+        except ReservationError as e:
+            if existing_item:
                 return JsonResponse({
-                    'error': f"Cannot add {quantity} items. Only {product_size.stock - existing_item.quantity} more available."
+                    'error': f"Cannot add {quantity} items. Only {max(e.available - in_cart, 0)} more available."
                 }, status=400)
+            return JsonResponse({
+                'error': f'Only {e.available} items available'
+            }, status=400)
             
         cart_item = cart.add_product(product, product_size, quantity)
 
@@ -106,33 +99,30 @@ class UpdateCartItemView(CartMixin, View):
     @transaction.atomic
     def post(self, request, item_id):
         cart = self.get_cart(request)
-        cart_item = get_object_or_404(CartItem, id=item_id, cart=cart)
+        cart_item = cart.get_item(item_id)
+        if cart_item is None:
+            raise Http404('Cart item not found')
 
         quantity = int(request.POST.get('quantity', 1))
 
         if quantity < 0:
             return JsonResponse({'error': 'Invalid quantity'}, status=400)
         
-        if quantity == 0:
-            cart_item.delete()
-        else:
-            if quantity > cart_item.product_size.stock:
-                return JsonResponse({
-                    'error': f'Only {cart_item.product_size.stock} items available'
-                }, status=400)
-            
-            cart_item.quantity = quantity
-            cart_item.save()
+        try:
+            reserve(cart.reservation_key, cart_item.product_size, quantity)
+        except ReservationError as e:
+            return JsonResponse({
+                'error': f'Only {e.available} items available'
+            }, status=400)
+
+        cart.update_item_quantity(cart_item.id, quantity)
 
         request.session['cart_id'] = cart.id
         request.session.modified = True
 
         context = {
             'cart': cart,
-            'cart_items': cart.items.select_related(
-                'product',
-                'product_size__size',
-            ).order_by('-added_at')
+            'cart_items': cart.get_items()
         }
         return TemplateResponse(request, 'cart/cart_modal.html', context)
     
@@ -140,24 +130,20 @@ class UpdateCartItemView(CartMixin, View):
 class RemoveCartItemView(CartMixin, View):
     def post(self, request, item_id):
         cart = self.get_cart(request)
+        cart_item = cart.get_item(item_id)
 
-        try:
-            cart_item = cart.items.get(id=item_id)
-            cart_item.delete()
+        if cart_item is None or not cart.remove_item(item_id):
+            return JsonResponse({'error': 'Item not found'}, status=400)
+        release(cart.existing_reservation_key, cart_item.product_size_id)
 
-            request.session['cart_id'] = cart.id
-            request.session.modified = True
+        request.session['cart_id'] = cart.id
+        request.session.modified = True
 
-            context = {
-                'cart': cart,
-                'cart_items': cart.items.select_related(
-                    'product',
-                    'product_size__size',
-                ).order_by('-added_at')
-            }
-            return TemplateResponse(request, 'cart/cart_modal.html', context)
-        except CartItem.DoesNotExist:
-            return JsonResponse({'error': 'Item not found'}, status=400)
+        context = {
+            'cart': cart,
+            'cart_items': cart.get_items()
+        }
+        return TemplateResponse(request, 'cart/cart_modal.html', context)
         
     
 class CartCountView(CartMixin, View):
@@ -173,6 +159,7 @@ class ClearCartView(CartMixin, View):
     def post(self, request):
         cart = self.get_cart(request)
         cart.clear()
+        release(cart.existing_reservation_key)
 
         request.session['cart_id'] = cart.id
         request.session.modified = True
@@ -192,9 +179,6 @@ class CartSummaryView(CartMixin, View):
         cart = self.get_cart(request)
         context = {
             'cart': cart,
-            'cart_items': cart.items.select_related(
-                'product',
-                'product_size__size'
-            ).order_by('-added_at')
+            'cart_items': cart.get_items()
         }
         return TemplateResponse(request, 'cart/cart_summary.html', context)
\ No newline at end of file
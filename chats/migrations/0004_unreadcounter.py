@@ -0,0 +1,51 @@
+# Generated by Django 5.2.7 on 2026-10-18 05:41
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, F, Q
+
+
+def backfill_unread_counters(apps, schema_editor):
+    Chat = apps.get_model('chats', 'Chat')
+    UnreadCounter = apps.get_model('chats', 'UnreadCounter')
+    Participant = Chat.participants.through
+    user_field = Chat._meta.get_field('participants').m2m_reverse_field_name()
+
+    # Непрочитанные каждого участника — одним сгруппированным запросом
+    rows = Participant.objects.annotate(unread=Count(
+        'chat__messages',
+        filter=Q(chat__messages__is_read=False)
+        & ~Q(chat__messages__sender_id=F(f'{user_field}_id')),
+    )).filter(unread__gt=0).values_list('chat_id', f'{user_field}_id', 'unread').order_by()
+    batch = []
+    for chat_id, user_id, count in rows.iterator(chunk_size=1000):
+        batch.append(UnreadCounter(chat_id=chat_id, user_id=user_id, count=count))
+        if len(batch) >= 1000:
+            UnreadCounter.objects.bulk_create(batch)
+            batch = []
+    UnreadCounter.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chats', '0003_message_chat_id_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UnreadCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('chat', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='unread_counters', to='chats.chat')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chat_unread_counters', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('chat', 'user')},
+            },
+        ),
+        migrations.RunPython(backfill_unread_counters, migrations.RunPython.noop),
+    ]
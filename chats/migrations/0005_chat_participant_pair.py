@@ -0,0 +1,55 @@
+# Generated by Django 5.2.7 on 2026-10-18 05:42
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_participant_pairs(apps, schema_editor):
+    # Ключ получают чаты ровно двух участников; если у пары уже несколько
+    # чатов, ключ достается самому раннему, остальные остаются без ключа
+    Chat = apps.get_model('chats', 'Chat')
+    Participant = Chat.participants.through
+    user_field = Chat._meta.get_field('participants').m2m_reverse_field_name()
+
+    participants = {}
+    rows = Participant.objects.values_list('chat_id', f'{user_field}_id').order_by('chat_id')
+    for chat_id, user_id in rows.iterator(chunk_size=1000):
+        participants.setdefault(chat_id, []).append(user_id)
+
+    seen = set()
+    for chat_id in sorted(participants):
+        users = participants[chat_id]
+        if len(users) != 2:
+            continue
+        pair = tuple(sorted(users))
+        if pair in seen:
+            continue
+        seen.add(pair)
+        Chat.objects.filter(pk=chat_id).update(user_low_id=pair[0], user_high_id=pair[1])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chats', '0004_unreadcounter'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chat',
+            name='user_high',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='chat',
+            name='user_low',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(backfill_participant_pairs, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='chat',
+            constraint=models.UniqueConstraint(fields=('user_low', 'user_high'), name='chat_participant_pair_uniq'),
+        ),
+    ]
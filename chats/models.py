@@ -5,11 +5,30 @@ from django.conf import settings
 class Chat(models.Model):
     """Чат между двумя пользователями"""
     participants = models.ManyToManyField(settings.AUTH_USER_MODEL, related_name='chats')
+    # Пара участников в каноническом порядке (меньший id, больший id):
+    # поиск чата двух пользователей — одно обращение к уникальному индексу.
+    # Удаление пользователя не удаляет переписку собеседника
+    user_low = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL,
+                                 related_name='+', null=True, blank=True, editable=False)
+    user_high = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL,
+                                  related_name='+', null=True, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['-updated_at']
+        constraints = [
+            models.UniqueConstraint(fields=['user_low', 'user_high'], name='chat_participant_pair_uniq'),
+        ]
+
+    @classmethod
+    def get_or_create_for_pair(cls, user, other):
+        """Чат двух пользователей; параллельные вызовы получают один и тот же чат"""
+        low, high = sorted([user.id, other.id])
+        chat, created = cls.objects.get_or_create(user_low_id=low, user_high_id=high)
+        if created:
+            chat.participants.add(user, other)
+        return chat, created
 
     def __str__(self):
         users = list(self.participants.all())
@@ -27,7 +46,7 @@ class Chat(models.Model):
 
     def get_unread_count(self, user):
         """Количество непрочитанных сообщений для пользователя"""
-        return self.messages.filter(is_read=False).exclude(sender=user).count()
+        return self.unread_counters.filter(user=user).values_list('count', flat=True).first() or 0
 
 
 class Message(models.Model):
@@ -40,6 +59,26 @@ class Message(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['chat', '-created_at'], name='message_chat_created_idx'),
+            # Догрузка новых сообщений: chat_id = ? AND id > since
+            models.Index(fields=['chat', 'id'], name='message_chat_id_idx'),
+            models.Index(fields=['chat', 'sender'], condition=models.Q(is_read=False),
+                         name='message_unread_idx'),
+        ]
 
     def __str__(self):
         return f"{self.sender.username}: {self.text[:50]}"
+
+
+class UnreadCounter(models.Model):
+    """Число непрочитанных сообщений чата для участника (см. chats.unread)"""
+    chat = models.ForeignKey(Chat, on_delete=models.CASCADE, related_name='unread_counters')
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='chat_unread_counters')
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('chat', 'user')
+
+    def __str__(self):
+        return f"{self.user_id} в чате #{self.chat_id}: {self.count}"
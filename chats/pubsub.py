@@ -0,0 +1,132 @@
+"""Публикация событий чатов для потоков SSE.
+
+Бэкенд выбирается настройкой CHAT_PUBSUB_BACKEND:
+
+* ``chats.pubsub.InProcessBroker`` — подписчики в памяти процесса
+  (разработка и тесты, один процесс сервера);
+* ``chats.pubsub.PostgresBroker`` — LISTEN/NOTIFY PostgreSQL, события
+  доходят до всех процессов. Каждый процесс держит одно соединение
+  LISTEN и раздает события своим подписчикам.
+
+В событиях передаются только идентификаторы, сами сообщения поток
+читает из БД.
+"""
+import asyncio
+import contextlib
+import json
+import logging
+import select
+import threading
+import time
+from collections import defaultdict
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connection, connections
+from django.utils.module_loading import import_string
+
+
+logger = logging.getLogger(__name__)
+
+
+def chat_channel(chat_id):
+    return f'chat:{chat_id}'
+
+
+class InProcessBroker:
+    """Рассылка событий подписчикам внутри текущего процесса"""
+
+    def __init__(self):
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def publish(self, channel, payload):
+        self._dispatch(channel, payload)
+
+    def _dispatch(self, channel, payload):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, payload)
+            except RuntimeError:
+                # Цикл событий подписчика уже закрыт
+                pass
+
+    @contextlib.asynccontextmanager
+    async def subscribe(self, channel):
+        """Очередь событий канала на время блока async with"""
+        subscriber = (asyncio.get_running_loop(), asyncio.Queue())
+        with self._lock:
+            self._subscribers[channel].add(subscriber)
+        try:
+            yield subscriber[1]
+        finally:
+            with self._lock:
+                self._subscribers[channel].discard(subscriber)
+                if not self._subscribers[channel]:
+                    del self._subscribers[channel]
+
+
+class PostgresBroker(InProcessBroker):
+    """События через LISTEN/NOTIFY PostgreSQL (psycopg2)"""
+
+    notify_channel = 'chat_events'
+    reconnect_delay = 1
+
+    def __init__(self):
+        super().__init__()
+        self._listener = None
+
+    def publish(self, channel, payload):
+        message = json.dumps({'channel': channel, 'payload': payload})
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_notify(%s, %s)', [self.notify_channel, message])
+
+    @contextlib.asynccontextmanager
+    async def subscribe(self, channel):
+        self._start_listener()
+        async with super().subscribe(channel) as queue:
+            yield queue
+
+    def _start_listener(self):
+        with self._lock:
+            if self._listener is None or not self._listener.is_alive():
+                self._listener = threading.Thread(
+                    target=self._listen, name='chat-events-listener', daemon=True
+                )
+                self._listener.start()
+
+    def _listen(self):
+        import psycopg2
+        import psycopg2.extensions
+
+        params = connections['default'].get_connection_params()
+        while True:
+            try:
+                conn = psycopg2.connect(**params)
+                conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                with conn.cursor() as cursor:
+                    cursor.execute(f'LISTEN {self.notify_channel}')
+                while True:
+                    if select.select([conn], [], [], 30) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        notify = conn.notifies.pop(0)
+                        event = json.loads(notify.payload)
+                        self._dispatch(event['channel'], event['payload'])
+            except Exception:
+                logger.exception('Chat events listener failed, reconnecting')
+                time.sleep(self.reconnect_delay)
+
+
+@lru_cache(maxsize=None)
+def get_broker():
+    backend = getattr(settings, 'CHAT_PUBSUB_BACKEND', 'chats.pubsub.InProcessBroker')
+    return import_string(backend)()
+
+
+def publish_message(message):
+    """Сообщить подписчикам чата о новом сообщении"""
+    get_broker().publish(chat_channel(message.chat_id), {'message': message.id})
@@ -0,0 +1,20 @@
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .models import Message
+from .pubsub import publish_message
+from .unread import count_new_message
+
+
+@receiver(post_save, sender=Message)
+def announce_message(sender, instance, created, **kwargs):
+    # Публикуем после коммита, чтобы поток уже мог прочитать сообщение
+    if created:
+        transaction.on_commit(lambda: publish_message(instance))
+
+
+@receiver(post_save, sender=Message)
+def update_unread_counters(sender, instance, created, **kwargs):
+    if created:
+        count_new_message(instance)
@@ -1,3 +1,57 @@
+from django.contrib.auth import get_user_model
 from django.test import TestCase
+from django.urls import reverse
 
-# Create your tests here.
+from .models import Chat, Message, UnreadCounter
+from .unread import mark_chat_read, unread_total
+
+
+class ChatTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        users = get_user_model().objects
+        cls.buyer = users.create_user('buyer@example.com', 'Иван', 'Петров', password='x')
+        cls.seller = users.create_user('seller@example.com', 'Анна', 'Сидорова', password='x')
+        cls.chat, _ = Chat.get_or_create_for_pair(cls.buyer, cls.seller)
+
+
+class MessageStreamTests(ChatTestCase):
+    def test_wsgi_request_falls_back_to_polling(self):
+        self.client.force_login(self.buyer)
+        response = self.client.get(reverse('chats:message_stream', args=[self.chat.id]))
+        self.assertEqual(response.status_code, 204)
+
+
+class UnreadCounterTests(ChatTestCase):
+    def unread(self, user):
+        return UnreadCounter.objects.get(chat=self.chat, user=user).count
+
+    def test_new_messages_increment_recipient_counter(self):
+        Message.objects.create(chat=self.chat, sender=self.buyer, text='Здравствуйте')
+        Message.objects.create(chat=self.chat, sender=self.buyer, text='Товар еще продается?')
+
+        self.assertEqual(self.unread(self.seller), 2)
+        self.assertFalse(UnreadCounter.objects.filter(user=self.buyer, count__gt=0).exists())
+
+    def test_mark_chat_read_resets_counter_and_total(self):
+        Message.objects.create(chat=self.chat, sender=self.buyer, text='Здравствуйте')
+        with self.captureOnCommitCallbacks(execute=True):
+            mark_chat_read(self.chat, self.seller)
+
+        self.assertEqual(self.unread(self.seller), 0)
+        self.assertEqual(unread_total(self.seller), 0)
+
+
+class ChatPairTests(ChatTestCase):
+    def test_same_chat_for_either_order(self):
+        chat, created = Chat.get_or_create_for_pair(self.seller, self.buyer)
+        self.assertEqual(chat, self.chat)
+        self.assertFalse(created)
+
+    def test_deleting_participant_keeps_chat(self):
+        Message.objects.create(chat=self.chat, sender=self.buyer, text='Здравствуйте')
+        self.seller.delete()
+
+        self.chat.refresh_from_db()
+        self.assertEqual(list(self.chat.participants.all()), [self.buyer])
+        self.assertEqual(self.chat.messages.count(), 1)
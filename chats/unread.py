@@ -0,0 +1,78 @@
+"""Счетчики непрочитанных сообщений.
+
+Для каждой пары (чат, участник) хранится строка UnreadCounter, которая
+меняется в той же транзакции, что и сообщения. Общее число непрочитанных
+пользователя кэшируется в общем для всех процессов кэше по умолчанию и
+сбрасывается после коммита изменений.
+"""
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Sum
+from django.db.models.functions import Greatest
+
+from .models import UnreadCounter
+
+
+UNREAD_TOTAL_TIMEOUT = 60 * 5
+
+
+def _total_key(user_id):
+    return f'chats:unread_total:{user_id}'
+
+
+def _reset_totals(user_ids):
+    keys = [_total_key(user_id) for user_id in user_ids]
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def count_new_message(message):
+    """Увеличить счетчики получателей нового сообщения"""
+    recipients = list(
+        message.chat.participants.exclude(id=message.sender_id).values_list('id', flat=True)
+    )
+    if not recipients:
+        return
+
+    # Недостающие строки создаются с нулем, а увеличение всегда идет
+    # через UPDATE: параллельная вставка той же строки не теряет +1
+    UnreadCounter.objects.bulk_create(
+        [UnreadCounter(chat_id=message.chat_id, user_id=user_id, count=0)
+         for user_id in recipients],
+        ignore_conflicts=True,
+    )
+    UnreadCounter.objects.filter(chat_id=message.chat_id, user_id__in=recipients).update(
+        count=F('count') + 1
+    )
+    _reset_totals(recipients)
+
+
+def mark_chat_read(chat, user):
+    """Отметить прочитанными все сообщения чата от собеседника"""
+    with transaction.atomic():
+        chat.messages.filter(is_read=False).exclude(sender=user).update(is_read=True)
+        UnreadCounter.objects.filter(chat=chat, user=user).exclude(count=0).update(count=0)
+        _reset_totals([user.id])
+
+
+def mark_messages_read(chat, user, message_ids):
+    """Отметить прочитанными полученные пользователем сообщения"""
+    with transaction.atomic():
+        read = chat.messages.filter(
+            id__in=message_ids, is_read=False
+        ).exclude(sender=user).update(is_read=True)
+        if read:
+            UnreadCounter.objects.filter(chat=chat, user=user).update(
+                count=Greatest(F('count') - read, 0)
+            )
+            _reset_totals([user.id])
+    return read
+
+
+def unread_total(user):
+    """Общее число непрочитанных сообщений пользователя"""
+    key = _total_key(user.id)
+    total = cache.get(key)
+    if total is None:
+        total = UnreadCounter.objects.filter(user=user).aggregate(total=Sum('count'))['total'] or 0
+        cache.set(key, total, UNREAD_TOTAL_TIMEOUT)
+    return total
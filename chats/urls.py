@@ -8,6 +8,8 @@ urlpatterns = [
     path('<int:chat_id>/', views.chat_detail, name='chat_detail'),
     path('<int:chat_id>/send/', views.send_message, name='send_message'),
     path('<int:chat_id>/messages/', views.get_messages, name='get_messages'),
+    path('<int:chat_id>/history/', views.message_history, name='message_history'),
+    path('<int:chat_id>/stream/', views.message_stream, name='message_stream'),
     path('api/unread-count/', views.unread_count, name='unread_count'),
     path('start/<slug:product_slug>/', views.start_chat_with_owner, name='start_chat_with_owner'),
 ]
@@ -1,35 +1,94 @@
+import asyncio
+
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, get_object_or_404, redirect
+from django.urls import reverse
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse
-from django.db.models import Q, Count, Max
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.db import close_old_connections, transaction
+from django.contrib.auth import get_user_model
+from django.db.models import Q, Count, Max, OuterRef, Prefetch, Subquery
+from django.db.models.functions import Coalesce
 from django.conf import settings
-from .models import Chat, Message
+from django.template.loader import render_to_string
+from main.pagination import KeysetPaginator
+from .models import Chat, Message, UnreadCounter
+from .pubsub import chat_channel, get_broker
+from .unread import mark_chat_read, mark_messages_read, unread_total
+
+
+# Комментарий-пинг, чтобы прокси не закрывали простаивающий поток
+STREAM_KEEPALIVE_SECONDS = 15
+# Поток периодически закрывается, браузер переподключается сам
+# (с заголовком Last-Event-ID), а воркер не занят бесконечно
+STREAM_MAX_SECONDS = 5 * 60
+STREAM_BATCH_SIZE = 50
+
+
+CHATS_PER_PAGE = 20
+MESSAGES_PER_PAGE = 50
+
+
+def inbox_chats(user):
+    """Чаты пользователя с последним сообщением, числом непрочитанных
+    и собеседником — одним запросом плюс prefetch участников"""
+    last_message = Message.objects.filter(chat=OuterRef('pk')).order_by('-created_at', '-id')
+    return Chat.objects.filter(participants=user).annotate(
+        last_message_id=Subquery(last_message.values('id')[:1]),
+        last_message_text=Subquery(last_message.values('text')[:1]),
+        last_message_sender_id=Subquery(last_message.values('sender_id')[:1]),
+        last_message_at=Subquery(last_message.values('created_at')[:1]),
+        unread_count=Coalesce(Subquery(
+            UnreadCounter.objects.filter(chat=OuterRef('pk'), user=user).values('count')[:1]
+        ), 0),
+    ).prefetch_related(Prefetch(
+        'participants',
+        queryset=get_user_model().objects.exclude(id=user.id),
+        to_attr='other_participants',
+    ))
 
 
 @login_required
 def chat_list(request):
     """Список всех чатов пользователя"""
-    chats = Chat.objects.filter(participants=request.user).prefetch_related('participants', 'messages')
-    
-    # Добавляем информацию о последнем сообщении и количестве непрочитанных
+    cursor = request.GET.get('cursor')
+    page = KeysetPaginator(
+        inbox_chats(request.user),
+        ordering=('-updated_at', '-id'),
+        per_page=CHATS_PER_PAGE,
+    ).get_page(cursor)
+
     chat_data = []
-    for chat in chats:
-        other_user = chat.get_other_user(request.user)
-        last_message = chat.get_last_message()
-        unread_count = chat.get_unread_count(request.user)
-        
+    for chat in page:
+        last_message = None
+        if chat.last_message_id:
+            last_message = Message(
+                id=chat.last_message_id,
+                chat=chat,
+                sender_id=chat.last_message_sender_id,
+                text=chat.last_message_text,
+                created_at=chat.last_message_at,
+            )
         chat_data.append({
             'chat': chat,
-            'other_user': other_user,
+            'other_user': chat.other_participants[0] if chat.other_participants else None,
             'last_message': last_message,
-            'unread_count': unread_count,
+            'unread_count': chat.unread_count,
         })
-    
+
+    next_page_url = None
+    if page.has_next:
+        next_page_url = f"{request.path}?cursor={page.next_cursor}"
+
     context = {
         'chat_data': chat_data,
+        'next_page_url': next_page_url,
     }
     
     if request.headers.get('HX-Request'):
+        if cursor:
+            return render(request, 'chats/partials/chat_items.html', context)
         return render(request, 'chats/chat_list_content.html', context)
     
     return render(request, 'chats/chat_list.html', context)
@@ -43,15 +102,12 @@ def chat_detail(request, chat_id):
     other_user = chat.get_other_user(request.user)
     
     # Отмечаем все сообщения как прочитанные
-    chat.messages.filter(is_read=False).exclude(sender=request.user).update(is_read=True)
-    
-    # Получаем сообщения (по 50 последних)
-    messages = chat.messages.all()[:50]
+    mark_chat_read(chat, request.user)
     
     context = {
         'chat': chat,
         'other_user': other_user,
-        'messages': reversed(messages),  # Показываем в хронологическом порядке
+        **_history_page(chat),
     }
     
     if request.headers.get('HX-Request'):
@@ -60,6 +116,32 @@ def chat_detail(request, chat_id):
     return render(request, 'chats/chat_detail.html', context)
 
 
+def _history_page(chat, cursor=None):
+    """Страница истории чата: MESSAGES_PER_PAGE сообщений старше курсора"""
+    page = KeysetPaginator(
+        chat.messages.select_related('sender'),
+        ordering=('-created_at', '-id'),
+        per_page=MESSAGES_PER_PAGE,
+    ).get_page(cursor)
+
+    older_messages_url = None
+    if page.has_next:
+        older_messages_url = f"{reverse('chats:message_history', args=[chat.id])}?cursor={page.next_cursor}"
+    return {
+        # Показываем в хронологическом порядке
+        'messages': page.object_list[::-1],
+        'older_messages_url': older_messages_url,
+    }
+
+
+@login_required
+def message_history(request, chat_id):
+    """Более ранние сообщения чата для кнопки «Загрузить ранние сообщения»"""
+    chat = get_object_or_404(Chat, id=chat_id, participants=request.user)
+    context = _history_page(chat, request.GET.get('cursor'))
+    return render(request, 'chats/partials/message_history.html', context)
+
+
 @login_required
 def send_message(request, chat_id):
     """Отправка сообщения через HTMX"""
@@ -89,30 +171,120 @@ def send_message(request, chat_id):
 
 @login_required
 def get_messages(request, chat_id):
-    """Получение сообщений для HTMX polling"""
+    """Получение сообщений для HTMX polling.
+
+    С параметром since (id последнего сообщения на странице) отдаются
+    только более новые сообщения, а если их нет — пустой ответ 204.
+    """
     chat = get_object_or_404(Chat, id=chat_id, participants=request.user)
-    messages = chat.messages.all()[:50]
-    
-    # Отмечаем новые сообщения как прочитанные
-    chat.messages.filter(is_read=False).exclude(sender=request.user).update(is_read=True)
+
+    try:
+        since = int(request.GET['since'])
+    except (KeyError, ValueError):
+        since = None
+
+    if since is None:
+        messages = list(reversed(chat.messages.select_related('sender')[:50]))
+    else:
+        messages = list(
+            chat.messages.filter(id__gt=since).select_related('sender').order_by('id')[:50]
+        )
+        if not messages:
+            return HttpResponse(status=204)
+
+    # Отмечаем полученные сообщения как прочитанные
+    mark_messages_read(chat, request.user, [message.id for message in messages])
     
     context = {
-        'messages': reversed(messages),
+        'messages': messages,
         'current_user': request.user,
     }
     return render(request, 'chats/partials/message_list.html', context)
 
 
+@transaction.non_atomic_requests
+@login_required
+async def message_stream(request, chat_id):
+    """Поток новых сообщений чата (Server-Sent Events).
+
+    Работает при запуске через ASGI (avito/asgi.py). Под WSGI ответ
+    отдается только целиком, поэтому поток сразу отвечает 204: браузер
+    не переподключается, и страница чата опрашивает get_messages.
+    """
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse(status=204)
+
+    user = await request.auser()
+    chat = await Chat.objects.filter(id=chat_id, participants=user).afirst()
+    if chat is None:
+        raise Http404('Чат не найден')
+
+    last_id = request.headers.get('Last-Event-ID') or request.GET.get('after')
+    try:
+        last_id = int(last_id)
+    except (TypeError, ValueError):
+        last_id = await chat.messages.order_by('-id').values_list('id', flat=True).afirst() or 0
+
+    response = StreamingHttpResponse(
+        _message_events(request, chat, user, last_id),
+        content_type='text/event-stream',
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+async def _message_events(request, chat, user, last_id):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + STREAM_MAX_SECONDS
+
+    async with get_broker().subscribe(chat_channel(chat.id)) as queue:
+        # Сообщения, отправленные до подписки, отдаем сразу
+        events, last_id = await _new_message_events(request, chat, user, last_id)
+        yield 'retry: 3000\n\n' + events
+
+        while loop.time() < deadline:
+            try:
+                await asyncio.wait_for(queue.get(), timeout=STREAM_KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield ': keepalive\n\n'
+                continue
+            while not queue.empty():
+                queue.get_nowait()
+
+            events, last_id = await _new_message_events(request, chat, user, last_id)
+            if events:
+                yield events
+
+
+async def _new_message_events(request, chat, user, last_id):
+    try:
+        messages = [
+            message async for message in
+            chat.messages.filter(id__gt=last_id).select_related('sender').order_by('id')[:STREAM_BATCH_SIZE]
+        ]
+        if messages:
+            await sync_to_async(mark_messages_read)(chat, user, [message.id for message in messages])
+    finally:
+        # Между пачками поток ждет событий, соединение с БД ему не нужно
+        await sync_to_async(close_old_connections)()
+    if not messages:
+        return '', last_id
+
+    events = []
+    for message in messages:
+        html = await sync_to_async(render_to_string)(
+            'chats/partials/message_item.html', {'message': message, 'request': request}
+        )
+        data = ''.join(f'data: {line}\n' for line in html.strip().splitlines())
+        events.append(f'id: {message.id}\nevent: message\n{data}\n')
+    return ''.join(events), messages[-1].id
+
+
 @login_required
 def unread_count(request):
     """API для получения количества непрочитанных сообщений"""
-    chats = Chat.objects.filter(participants=request.user)
-    total_unread = 0
-    
-    for chat in chats:
-        total_unread += chat.get_unread_count(request.user)
-    
-    return JsonResponse({'unread_count': total_unread})
+    return JsonResponse({'unread_count': unread_total(request.user)})
 
 
 @login_required
@@ -131,16 +303,7 @@ def start_chat_with_owner(request, product_slug):
     if owner == request.user:
         return redirect('main:index')
     
-    # Проверяем, существует ли уже чат между этими пользователями
-    existing_chat = Chat.objects.filter(participants=request.user).filter(participants=owner).first()
-    
-    if existing_chat:
-        # Если чат существует, перенаправляем на него
-        return redirect('chats:chat_detail', chat_id=existing_chat.id)
-    
-    # Создаем новый чат
-    new_chat = Chat.objects.create()
-    new_chat.participants.add(request.user, owner)
+    # Находим существующий чат по паре участников или создаем новый
+    chat, created = Chat.get_or_create_for_pair(request.user, owner)
     
-    # Перенаправляем на новый чат
-    return redirect('chats:chat_detail', chat_id=new_chat.id)
+    return redirect('chats:chat_detail', chat_id=chat.id)
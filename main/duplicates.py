@@ -0,0 +1,143 @@
+"""Поиск повторно выложенных фотографий товаров.
+
+Для главного и дополнительных изображений товара считается разностный
+хэш (dHash, 64 бита): снимок уменьшается до 9x8 в оттенках серого, и
+каждый бит показывает, ярче ли пиксель соседа справа. Пересжатые и
+уменьшенные копии одной фотографии дают хэши с малым расстоянием
+Хэмминга.
+
+Хэш хранится в ``ImageFingerprint`` вместе с четырьмя 16-битными
+полосами, у каждой свой индекс. Если расстояние между хэшами не больше
+трех бит, хотя бы одна полоса совпадает целиком, поэтому кандидаты
+выбираются по равенству полос, а точное расстояние считается в Python.
+
+Полосы из одних нулей или единиц дает однотонный фон, который есть на
+большинстве снимков товаров; такие полосы совпадают у значительной части
+таблицы, поэтому по ним кандидаты не ищутся, а сама выборка ограничена.
+"""
+import logging
+
+from django.db.models import Q
+
+from .models import ImageFingerprint, Product, ProductImage
+
+
+logger = logging.getLogger(__name__)
+
+HASH_SIZE = 8
+BANDS = 4
+BAND_BITS = HASH_SIZE * HASH_SIZE // BANDS
+# Расстояние, при котором все совпадения гарантированно находятся по полосам
+MAX_DISTANCE = BANDS - 1
+DUPLICATES_LIMIT = 5
+CANDIDATES_LIMIT = 200
+# Полосы однотонного фона
+DEGENERATE_BANDS = {0, (1 << BAND_BITS) - 1}
+
+
+def dhash(file):
+    """64-битный разностный хэш изображения"""
+    from PIL import Image
+
+    with Image.open(file) as image:
+        pixels = list(
+            image.convert('L').resize((HASH_SIZE + 1, HASH_SIZE), Image.Resampling.LANCZOS).getdata()
+        )
+    value = 0
+    for row in range(HASH_SIZE):
+        for col in range(HASH_SIZE):
+            offset = row * (HASH_SIZE + 1) + col
+            value = (value << 1) | (pixels[offset] > pixels[offset + 1])
+    return value
+
+
+def hash_bands(value):
+    mask = (1 << BAND_BITS) - 1
+    return [(value >> (BAND_BITS * band)) & mask for band in range(BANDS)]
+
+
+def to_signed(value):
+    """Хэш для BigIntegerField (знаковые 64 бита)"""
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def hamming(first, second):
+    return bin((first ^ second) & ((1 << 64) - 1)).count('1')
+
+
+def fingerprint_image(product, field_file, is_main=False):
+    """Посчитать и сохранить хэш изображения товара.
+
+    Повторный вызов для того же файла ничего не делает; при замене или
+    удалении главного изображения старый хэш удаляется.
+    """
+    existing = ImageFingerprint.objects.filter(product=product, is_main=is_main)
+    if not field_file:
+        if is_main:
+            existing.delete()
+        return None
+
+    if is_main:
+        # Главное изображение одно: хэш прежнего файла больше не нужен
+        existing.exclude(image=field_file.name).delete()
+    if existing.filter(image=field_file.name).exists():
+        return None
+
+    try:
+        field_file.open('rb')
+        try:
+            value = dhash(field_file)
+        finally:
+            field_file.close()
+    except (OSError, ValueError):
+        logger.warning('Cannot fingerprint image %s', field_file.name)
+        return None
+
+    bands = hash_bands(value)
+    return ImageFingerprint.objects.create(
+        product=product,
+        image=field_file.name,
+        is_main=is_main,
+        hash=to_signed(value),
+        **{f'band_{band}': bands[band] for band in range(BANDS)},
+    )
+
+
+def possible_duplicates(product, limit=DUPLICATES_LIMIT):
+    """Другие товары с похожими фотографиями: [(товар, расстояние), ...]"""
+    hashes = list(ImageFingerprint.objects.filter(product=product).values_list('hash', flat=True))
+    if not hashes:
+        return []
+
+    bands = Q()
+    for value in hashes:
+        for band, band_value in enumerate(hash_bands(value & ((1 << 64) - 1))):
+            if band_value not in DEGENERATE_BANDS:
+                bands |= Q(**{f'band_{band}': band_value})
+    if not bands:
+        return []
+
+    closest = {}
+    candidates = ImageFingerprint.objects.filter(bands).exclude(product=product).order_by('-id')
+    for product_id, candidate in candidates.values_list('product_id', 'hash')[:CANDIDATES_LIMIT]:
+        distance = min(hamming(value, candidate) for value in hashes)
+        if distance <= MAX_DISTANCE and distance < closest.get(product_id, MAX_DISTANCE + 1):
+            closest[product_id] = distance
+
+    nearest = sorted(closest.items(), key=lambda item: (item[1], -item[0]))[:limit]
+    products = Product.objects.select_related('owner', 'moderation').in_bulk(
+        [product_id for product_id, _ in nearest]
+    )
+    return [(products[product_id], distance) for product_id, distance in nearest if product_id in products]
+
+
+def rebuild_image_fingerprints():
+    """Посчитать хэши изображений, для которых их еще нет"""
+    total = 0
+    for product in Product.objects.only('id', 'main_image').iterator():
+        if fingerprint_image(product, product.main_image, is_main=True):
+            total += 1
+    for image in ProductImage.objects.select_related('product').only('image', 'product__id').iterator():
+        if fingerprint_image(image.product, image.image):
+            total += 1
+    return total
@@ -0,0 +1,109 @@
+"""Подсчет количества товаров по значениям фильтров каталога.
+
+Все измерения считаются одним запросом, результат кэшируется для
+конкретной комбинации фильтров. При изменении товаров, остатков или
+модерации кэш сбрасывается сменой версии (см. main.signals). Версия
+хранится в общем для всех процессов кэше по умолчанию, иначе сброс
+доходил бы только до процесса, сохранившего запись.
+"""
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.db.models import CharField, Count, F, Min, Value
+
+
+FACET_CACHE_TIMEOUT = 60 * 5
+FACET_VERSION_KEY = 'catalog_facets:version'
+BRAND_FACET_LIMIT = 20
+
+
+def _facet_version():
+    version = cache.get(FACET_VERSION_KEY)
+    if version is None:
+        cache.add(FACET_VERSION_KEY, 1, None)
+        version = cache.get(FACET_VERSION_KEY, 1)
+    return version
+
+
+def invalidate_facet_counts():
+    """Сбросить все закэшированные счетчики фильтров"""
+    try:
+        cache.incr(FACET_VERSION_KEY)
+    except ValueError:
+        cache.add(FACET_VERSION_KEY, 1, None)
+
+
+# Измерение: (поле значения, поле подписи)
+FACET_FIELDS = {
+    'category': ('category__slug', 'category__slug'),
+    'size': ('product_sizes__size__name', 'product_sizes__size__name'),
+    'condition': ('condition', 'condition'),
+    'brand': ('brand_key', 'brand'),
+}
+
+
+def _facet_queryset(queryset, filters, dimension):
+    """Товары со всеми фильтрами, кроме фильтра самого измерения"""
+    for name, (filter_func, value) in filters.items():
+        if name != dimension:
+            queryset = filter_func(queryset, value)
+    if dimension == 'size':
+        queryset = queryset.filter(product_sizes__stock__gt=0)
+    elif dimension == 'brand':
+        queryset = queryset.exclude(brand_key='')
+        # Брендов может быть сколько угодно: в выборку попадают только
+        # BRAND_FACET_LIMIT самых частых. SQLite не допускает LIMIT в
+        # частях UNION, поэтому ограничение вынесено в подзапрос
+        top_brands = (
+            queryset.order_by().values('brand_key')
+            .annotate(count=Count('id', distinct=True))
+            .order_by('-count', 'brand_key')
+            .values('brand_key')[:BRAND_FACET_LIMIT]
+        )
+        queryset = queryset.filter(brand_key__in=top_brands)
+    return queryset
+
+
+def compute_facet_counts(queryset, filters):
+    """Счетчики всех измерений одним запросом (UNION ALL группировок).
+
+    filters — примененные фильтры каталога {измерение: (функция, значение)}.
+    Каждое измерение считается без собственного фильтра, чтобы при выборе
+    одного значения остальные варианты не обнулялись.
+    """
+    grouped = [
+        _facet_queryset(queryset, filters, dimension).order_by().values(
+            dimension=Value(dimension, output_field=CharField()),
+            value=F(value_field),
+        ).annotate(label=Min(label_field), count=Count('id', distinct=True))
+        for dimension, (value_field, label_field) in FACET_FIELDS.items()
+    ]
+
+    counts = {'category': {}, 'size': {}, 'condition': {}}
+    brands = []
+    for row in grouped[0].union(*grouped[1:], all=True):
+        if not row['value']:
+            continue
+        if row['dimension'] == 'brand':
+            brands.append((row['value'], row['label'], row['count']))
+        else:
+            counts[row['dimension']][row['value']] = row['count']
+
+    brands.sort(key=lambda brand: (-brand[2], brand[0]))
+    counts['brand'] = [(label, count) for _, label, count in brands]
+    return counts
+
+
+def get_facet_counts(queryset, filters, params):
+    """Счетчики фильтров для queryset, закэшированные по набору параметров"""
+    digest = hashlib.md5(
+        json.dumps(params, sort_keys=True, ensure_ascii=False).encode()
+    ).hexdigest()
+    key = f'catalog_facets:{_facet_version()}:{digest}'
+
+    counts = cache.get(key)
+    if counts is None:
+        counts = compute_facet_counts(queryset, filters)
+        cache.set(key, counts, FACET_CACHE_TIMEOUT)
+    return counts
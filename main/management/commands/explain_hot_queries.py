@@ -0,0 +1,68 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from chats.models import Chat, Message, UnreadCounter
+from main.models import BlogPost, Product
+from moderator.models import ModerationStatus, ProductModeration
+from orders.models import Order
+from users.models import Wishlist
+
+
+def hot_queries():
+    """Характерные запросы основных страниц (параметры — заглушки)"""
+    user_id = chat_id = category_id = 0
+    return [
+        ('main.CatalogView', Product.objects.filter(
+            is_active=True, is_approved=True).order_by('-created_at', '-id')[:25]),
+        ('main.CatalogView (категория)', Product.objects.filter(
+            is_active=True, is_approved=True, category_id=category_id).order_by('-created_at', '-id')[:25]),
+        ('main.BlogView', BlogPost.objects.filter(is_published=True).order_by('-created_at')[:6]),
+        ('moderator.pending_listings', ProductModeration.objects.filter(
+            status=ModerationStatus.PENDING).order_by('-created_at')[:20]),
+        ('moderator.approved_listings', ProductModeration.objects.filter(
+            status=ModerationStatus.APPROVED).order_by('-moderated_at')[:20]),
+        ('chats.chat_detail', Message.objects.filter(chat_id=chat_id).order_by('-created_at')[:50]),
+        ('chats.unread_count', UnreadCounter.objects.filter(user_id=user_id)),
+        ('chats.chat_list', Chat.objects.filter(participants=user_id)),
+        ('orders.OrderHistoryView', Order.objects.filter(user_id=user_id).order_by('-created_at')),
+        ('users.wishlist_view', Wishlist.objects.filter(user_id=user_id).order_by('-added_at')),
+        ('users.profile_view', Product.objects.filter(owner_id=user_id, is_active=True)),
+    ]
+
+
+def scanned_tables(plan):
+    """Таблицы, которые читаются полным перебором"""
+    tables = []
+    for line in plan.splitlines():
+        line = line.strip()
+        if connection.vendor == 'postgresql':
+            if 'Seq Scan on' in line:
+                tables.append(line.split('Seq Scan on', 1)[1].split()[0])
+        elif connection.vendor == 'sqlite':
+            words = line.split()
+            if 'SCAN' in words and 'INDEX' not in words:
+                tables.append(words[words.index('SCAN') + 1])
+    return tables
+
+
+class Command(BaseCommand):
+    help = ('Выполнить EXPLAIN для характерных запросов представлений и показать, '
+            'какие из них читают таблицы полным перебором')
+
+    def handle(self, *args, **options):
+        scans = 0
+        for name, queryset in hot_queries():
+            plan = queryset.explain()
+            tables = scanned_tables(plan)
+            if tables:
+                scans += 1
+                self.stdout.write(self.style.WARNING(f'SCAN  {name}: {", ".join(tables)}'))
+            else:
+                self.stdout.write(self.style.SUCCESS(f'OK    {name}'))
+            if options['verbosity'] > 1:
+                self.stdout.write(plan)
+
+        self.stdout.write(f'Запросов с полным перебором: {scans}')
+        if connection.vendor == 'postgresql':
+            self.stdout.write('На маленьких таблицах PostgreSQL может выбирать Seq Scan '
+                              'даже при наличии индекса — запускайте на реальных данных.')
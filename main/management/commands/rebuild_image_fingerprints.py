@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from main.duplicates import rebuild_image_fingerprints
+
+
+class Command(BaseCommand):
+    help = 'Посчитать перцептивные хэши изображений товаров, у которых их еще нет'
+
+    def handle(self, *args, **options):
+        total = rebuild_image_fingerprints()
+        self.stdout.write(self.style.SUCCESS(f'Хэши посчитаны, изображений: {total}'))
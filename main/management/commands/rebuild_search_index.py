@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from main.search import rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = 'Перестроить поисковый индекс товаров'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Количество товаров в одной пачке')
+
+    def handle(self, *args, **options):
+        total = rebuild_search_index(
+            batch_size=options['batch_size'],
+            stdout=self.stdout if options['verbosity'] > 1 else None,
+        )
+        self.stdout.write(self.style.SUCCESS(f'Поисковый индекс перестроен, товаров: {total}'))
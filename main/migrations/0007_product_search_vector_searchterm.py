@@ -0,0 +1,55 @@
+# Generated by Django 5.2.7 on 2026-10-18 05:28
+
+import django.contrib.postgres.search
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def create_search_vector_index(apps, schema_editor):
+    # GIN-индекс и заполнение tsvector есть только в PostgreSQL,
+    # для остальных СУБД индекс строится командой rebuild_search_index
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        "UPDATE main_product SET search_vector = "
+        "setweight(to_tsvector('russian', coalesce(name, '')), 'A') || "
+        "setweight(to_tsvector('russian', coalesce(description, '')), 'B')"
+    )
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS main_product_search_vector_gin '
+        'ON main_product USING gin (search_vector)'
+    )
+
+
+def drop_search_vector_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS main_product_search_vector_gin')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0006_product_no_size_productsize_custom_size_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.CreateModel(
+            name='SearchTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64)),
+                ('weight', models.PositiveSmallIntegerField(default=1)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to='main.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['term', 'product'], name='main_searchterm_term_idx')],
+            },
+        ),
+        migrations.RunPython(create_search_vector_index, drop_search_vector_index),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.7 on 2026-10-18 05:29
+
+from django.db import migrations, models
+
+
+def normalize(value):
+    return ' '.join((value or '').split()).lower().replace('ё', 'е')
+
+
+def backfill_facet_keys(apps, schema_editor):
+    Product = apps.get_model('main', 'Product')
+    batch_size = 1000
+    last_id = 0
+    while True:
+        products = list(
+            Product.objects.filter(id__gt=last_id)
+            .order_by('id')
+            .only('id', 'color', 'material', 'brand')[:batch_size]
+        )
+        if not products:
+            break
+        for product in products:
+            product.color_key = normalize(product.color)
+            product.material_key = normalize(product.material)
+            product.brand_key = normalize(product.brand)
+        Product.objects.bulk_update(products, ['color_key', 'material_key', 'brand_key'])
+        last_id = products[-1].id
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0007_product_search_vector_searchterm'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='brand_key',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='color_key',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='material_key',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=100),
+        ),
+        migrations.RunPython(backfill_facet_keys, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.7 on 2026-10-18 05:30
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_is_approved(apps, schema_editor):
+    Product = apps.get_model('main', 'Product')
+    Product.objects.filter(moderation__status='approved').update(is_approved=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0008_product_facet_keys'),
+        ('moderator', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='is_approved',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.RunPython(backfill_is_approved, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True), ('is_approved', True)), fields=['-created_at', '-id'], name='product_visible_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True), ('is_approved', True)), fields=['category', '-created_at', '-id'], name='product_visible_category_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.7 on 2026-10-18 05:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0009_product_is_approved'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='blogpost',
+            index=models.Index(condition=models.Q(('is_published', True)), fields=['-created_at'], name='blogpost_published_idx'),
+        ),
+    ]
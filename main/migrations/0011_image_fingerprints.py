@@ -0,0 +1,32 @@
+# Generated by Django 5.2.7 on 2026-10-18 05:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0010_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageFingerprint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('image', models.CharField(max_length=255)),
+                ('is_main', models.BooleanField(default=False)),
+                ('hash', models.BigIntegerField()),
+                ('band_0', models.PositiveIntegerField()),
+                ('band_1', models.PositiveIntegerField()),
+                ('band_2', models.PositiveIntegerField()),
+                ('band_3', models.PositiveIntegerField()),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='image_fingerprints', to='main.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['band_0'], name='fingerprint_band_0_idx'), models.Index(fields=['band_1'], name='fingerprint_band_1_idx'), models.Index(fields=['band_2'], name='fingerprint_band_2_idx'), models.Index(fields=['band_3'], name='fingerprint_band_3_idx')],
+                'unique_together': {('product', 'image')},
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.7 on 2026-10-18 07:10
+
+from django.db import migrations
+
+
+FACET_KEYS = ('color_key', 'material_key', 'brand_key')
+
+
+def create_trigram_indexes(apps, schema_editor):
+    # Фильтры каталога ищут подстроку (LIKE '%...%'), ее обслуживает только
+    # триграммный GIN-индекс PostgreSQL; в остальных СУБД индекса нет
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for column in FACET_KEYS:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS main_product_{column}_trgm '
+            f'ON main_product USING gin ({column} gin_trgm_ops)'
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for column in FACET_KEYS:
+        schema_editor.execute(f'DROP INDEX IF EXISTS main_product_{column}_trgm')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0011_image_fingerprints'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
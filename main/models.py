@@ -1,12 +1,14 @@
 from django.db import models
 from django.utils.text import slugify
 from django.conf import settings
+from django.contrib.postgres.search import SearchVectorField
 
-try:
-    from unidecode import unidecode
-    HAS_UNIDECODE = True
-except ImportError:
-    HAS_UNIDECODE = False
+from .slugs import save_with_slug
+
+
+def normalize_facet(value):
+    """Нормализованное значение фильтра: нижний регистр, без лишних пробелов"""
+    return ' '.join((value or '').split()).lower().replace('ё', 'е')
 
 
 class Category(models.Model):
@@ -57,6 +59,9 @@ class Product(models.Model):
     main_image = models.ImageField(upload_to='products/main/')
     
     is_active = models.BooleanField(default=True)
+    # Копия статуса модерации (moderator.ProductModeration), чтобы
+    # публичные запросы каталога обходились без JOIN
+    is_approved = models.BooleanField(default=False, editable=False)
     total_stock = models.PositiveIntegerField(default=0)
     no_size = models.BooleanField(default=False)
     
@@ -69,34 +74,59 @@ class Product(models.Model):
                                  ])
     material = models.CharField(max_length=100, blank=True)
     brand = models.CharField(max_length=100, blank=True)
+
+    # Нормализованные копии цвета, материала и бренда для фильтров каталога
+    color_key = models.CharField(max_length=100, blank=True, default='',
+                                 db_index=True, editable=False)
+    material_key = models.CharField(max_length=100, blank=True, default='',
+                                    db_index=True, editable=False)
+    brand_key = models.CharField(max_length=100, blank=True, default='',
+                                 db_index=True, editable=False)
     
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Заполняется только в PostgreSQL, см. main.search
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-created_at', '-id'],
+                         condition=models.Q(is_active=True, is_approved=True),
+                         name='product_visible_recent_idx'),
+            models.Index(fields=['category', '-created_at', '-id'],
+                         condition=models.Q(is_active=True, is_approved=True),
+                         name='product_visible_category_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Имя главного изображения при загрузке, см. main.signals
+        if 'main_image' in field_names:
+            instance._loaded_main_image = values[field_names.index('main_image')]
+        return instance
+
     def save(self, *args, **kwargs):
-        if not self.slug:
-            if HAS_UNIDECODE:
-                transliterated_name = unidecode(self.name)
-            else:
-                transliterated_name = self.name
-            
-            base_slug = slugify(transliterated_name)
-            
-            if not base_slug:
-                import uuid
-                base_slug = f"product-{uuid.uuid4().hex[:8]}"
-            
-            slug = base_slug
-            counter = 1
-            while Product.objects.filter(slug=slug).exists():
-                slug = f"{base_slug}-{counter}"
-                counter += 1
-            self.slug = slug
-        
         if self.total_stock == 0 and self.is_active:
             self.is_active = False
+
+        self.color_key = normalize_facet(self.color)
+        self.material_key = normalize_facet(self.material)
+        self.brand_key = normalize_facet(self.brand)
+        if kwargs.get('update_fields') is not None:
+            update_fields = set(kwargs['update_fields'])
+            for field in ('color', 'material', 'brand'):
+                if field in update_fields:
+                    update_fields.add(f'{field}_key')
+            kwargs['update_fields'] = update_fields
             
-        super().save(*args, **kwargs)
+        save_with_slug(self, self.name, 'product', lambda: super(Product, self).save(*args, **kwargs))
+
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or {'name', 'description'} & set(update_fields):
+            from .search import update_search_index
+            update_search_index(self)
 
     
     def __str__(self):
@@ -116,12 +146,53 @@ class Product(models.Model):
         return False
 
 
+class SearchTerm(models.Model):
+    """Инвертированный индекс для поиска без PostgreSQL"""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE,
+                                related_name='search_terms')
+    term = models.CharField(max_length=64)
+    weight = models.PositiveSmallIntegerField(default=1)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['term', 'product'], name='main_searchterm_term_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.term} ({self.product_id})"
+
+
 class ProductImage(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, 
                                 related_name='images')
     image = models.ImageField(upload_to='products/extra/')
 
 
+class ImageFingerprint(models.Model):
+    """Перцептивный хэш изображения товара, см. main.duplicates"""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE,
+                                related_name='image_fingerprints')
+    image = models.CharField(max_length=255)
+    is_main = models.BooleanField(default=False)
+    hash = models.BigIntegerField()
+    band_0 = models.PositiveIntegerField()
+    band_1 = models.PositiveIntegerField()
+    band_2 = models.PositiveIntegerField()
+    band_3 = models.PositiveIntegerField()
+
+    class Meta:
+        unique_together = ('product', 'image')
+        indexes = [
+            models.Index(fields=['band_0'], name='fingerprint_band_0_idx'),
+            models.Index(fields=['band_1'], name='fingerprint_band_1_idx'),
+            models.Index(fields=['band_2'], name='fingerprint_band_2_idx'),
+            models.Index(fields=['band_3'], name='fingerprint_band_3_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.image} ({self.product_id})"
+
+
 class ContactMessage(models.Model):
     phone = models.CharField(max_length=20, verbose_name='Телефон')
     email = models.EmailField(verbose_name='Email')
@@ -153,27 +224,13 @@ class BlogPost(models.Model):
         verbose_name = 'Статья'
         verbose_name_plural = 'Статьи блога'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-created_at'], condition=models.Q(is_published=True),
+                         name='blogpost_published_idx'),
+        ]
     
     def save(self, *args, **kwargs):
-        if not self.slug:
-            if HAS_UNIDECODE:
-                transliterated_title = unidecode(self.title)
-            else:
-                transliterated_title = self.title
-            
-            base_slug = slugify(transliterated_title)
-            
-            if not base_slug:
-                import uuid
-                base_slug = f"post-{uuid.uuid4().hex[:8]}"
-            
-            slug = base_slug
-            counter = 1
-            while BlogPost.objects.filter(slug=slug).exists():
-                slug = f"{base_slug}-{counter}"
-                counter += 1
-            self.slug = slug
-        super().save(*args, **kwargs)
+        save_with_slug(self, self.title, 'post', lambda: super(BlogPost, self).save(*args, **kwargs))
     
     def __str__(self):
         return self.title
@@ -0,0 +1,108 @@
+import base64
+import binascii
+import datetime
+import json
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+
+
+class KeysetPage:
+    """Одна страница keyset-пагинации"""
+
+    def __init__(self, object_list, next_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+
+class KeysetPaginator:
+    """Пагинация по курсору вместо OFFSET.
+
+    Курсор хранит значения полей сортировки последней строки страницы,
+    поэтому каждая следующая страница — это диапазонный запрос по индексу,
+    а не пропуск всех предыдущих строк.
+    """
+
+    def __init__(self, queryset, ordering=('-created_at', '-id'), per_page=24):
+        self.ordering = tuple(ordering)
+        self.fields = [name.lstrip('-') for name in self.ordering]
+        self.queryset = queryset.order_by(*self.ordering)
+        self.per_page = per_page
+
+    def get_page(self, cursor=None):
+        queryset = self.queryset
+        values = self.decode_cursor(cursor)
+        if values is not None:
+            queryset = queryset.filter(self._after(values))
+
+        # Берем на одну строку больше, чтобы узнать, есть ли следующая страница
+        rows = list(queryset[:self.per_page + 1])
+        next_cursor = None
+        if len(rows) > self.per_page:
+            rows = rows[:self.per_page]
+            next_cursor = self.encode_cursor(rows[-1])
+        return KeysetPage(rows, next_cursor)
+
+    def _after(self, values):
+        """Условие «строго после» для лексикографического порядка полей"""
+        condition = Q()
+        for position, field in enumerate(self.fields):
+            lookup = 'lt' if self.ordering[position].startswith('-') else 'gt'
+            step = Q(**{f'{field}__{lookup}': values[position]})
+            for previous in range(position):
+                step &= Q(**{self.fields[previous]: values[previous]})
+            condition |= step
+        return condition
+
+    def encode_cursor(self, obj):
+        values = [getattr(obj, field) for field in self.fields]
+        # DjangoJSONEncoder обрезает микросекунды до миллисекунд, из-за чего
+        # строки между обрезанным и настоящим значением пропадали бы
+        values = [
+            value.isoformat() if isinstance(value, (datetime.datetime, datetime.time)) else value
+            for value in values
+        ]
+        raw = json.dumps(values, cls=DjangoJSONEncoder)
+        return base64.urlsafe_b64encode(raw.encode()).decode()
+
+    def decode_cursor(self, cursor):
+        if not cursor:
+            return None
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        except (binascii.Error, ValueError):
+            return None
+        if not isinstance(values, list) or len(values) != len(self.fields):
+            return None
+
+        decoded = []
+        for field_name, value in zip(self.fields, values):
+            # Курсор приходит из запроса: None, списки и словари в нем не бывают
+            if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+                return None
+            try:
+                decoded.append(self._output_field(field_name).to_python(value))
+            except (TypeError, ValueError, ValidationError):
+                return None
+        return decoded
+
+    def _output_field(self, field_name):
+        """Поле модели или тип аннотации (например, целочисленного ранга поиска)"""
+        try:
+            return self.queryset.model._meta.get_field(field_name)
+        except FieldDoesNotExist:
+            return self.queryset.query.annotations[field_name].output_field
@@ -0,0 +1,216 @@
+"""Полнотекстовый поиск по товарам.
+
+В PostgreSQL используется колонка ``Product.search_vector`` (tsvector с
+GIN-индексом и русской морфологией). Для остальных СУБД (SQLite в тестах)
+поддерживается простой инвертированный индекс в таблице ``SearchTerm``
+со стеммингом на стороне Python.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Exists, F, IntegerField, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Cast, Coalesce
+
+
+SEARCH_CONFIG = 'russian'
+# ts_rank возвращает real; для курсора пагинации ранг переводится в целое
+# с этой точностью, иначе сравнение с пересчитанным float пропускает строки
+RANK_PRECISION = 10 ** 6
+
+NAME_WEIGHT = 3
+DESCRIPTION_WEIGHT = 1
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+# Стеммер Портера для русского языка (упрощенная версия Snowball)
+_PERFECTIVE_GERUND = re.compile(r'((ив|ивши|ившись|ыв|ывши|ывшись)|((?<=[ая])(в|вши|вшись)))$')
+_REFLEXIVE = re.compile(r'(с[яь])$')
+_ADJECTIVE = re.compile(r'(ее|ие|ые|ое|ими|ыми|ей|ий|ый|ой|ем|им|ым|ом|его|ого|ему|ому|их|ых|ую|юю|ая|яя|ою|ею)$')
+_PARTICIPLE = re.compile(r'((ивш|ывш|ующ)|((?<=[ая])(ем|нн|вш|ющ|щ)))$')
+_VERB = re.compile(r'((ила|ыла|ена|ейте|уйте|ите|или|ыли|ей|уй|ил|ыл|им|ым|ен|ило|ыло|ено|ят|ует|уют|ит|ыт|ены|ить|ыть|ишь|ую|ю)'
+                   r'|((?<=[ая])(ла|на|ете|йте|ли|й|л|ем|н|ло|но|ет|ют|ны|ть|ешь|нно)))$')
+_NOUN = re.compile(r'(а|ев|ов|ие|ье|е|иями|ями|ами|еи|ии|и|ией|ей|ой|ий|й|иям|ям|ием|ем|ам|ом|о|у|ах|иях|ях|ы|ь|ию|ью|ю|ия|ья|я)$')
+_RV = re.compile(r'^(.*?[аеиоуыэюя])(.*)$')
+_DERIVATIONAL = re.compile(r'.*[^аеиоуыэюя]+[аеиоуыэюя].*ость?$')
+_DER = re.compile(r'ость?$')
+_SUPERLATIVE = re.compile(r'(ейше|ейш)$')
+
+
+def stem(word):
+    """Привести слово к основе (для кириллицы), латиницу оставить как есть"""
+    word = word.lower().replace('ё', 'е')
+    match = _RV.match(word)
+    if not match:
+        return word
+
+    start, rv = match.groups()
+    temp = _PERFECTIVE_GERUND.sub('', rv, 1)
+    if temp == rv:
+        rv = _REFLEXIVE.sub('', rv, 1)
+        temp = _ADJECTIVE.sub('', rv, 1)
+        if temp != rv:
+            rv = _PARTICIPLE.sub('', temp, 1)
+        else:
+            temp = _VERB.sub('', rv, 1)
+            rv = _NOUN.sub('', rv, 1) if temp == rv else temp
+    else:
+        rv = temp
+
+    rv = re.sub(r'и$', '', rv, 1)
+    if _DERIVATIONAL.match(rv):
+        rv = _DER.sub('', rv, 1)
+
+    temp = re.sub(r'ь$', '', rv, 1)
+    if temp == rv:
+        rv = _SUPERLATIVE.sub('', rv, 1)
+        rv = re.sub(r'нн$', 'н', rv, 1)
+    else:
+        rv = temp
+    return start + rv
+
+
+# Беглая гласная: у «кроссовки», «кошельки» основы «кроссовк», «кошельк»,
+# а «кроссовок», «кошелек» стеммер оставляет целиком
+_FLEETING_O = re.compile(r'(?<=[бвгджзклмнпрстфхцчшщ])к$')
+_FLEETING_E = re.compile(r'ьк$')
+
+
+def stem_variants(term):
+    """Основа и ее форма с беглой гласной, если она возможна"""
+    if len(term) < 4:
+        return [term]
+    if _FLEETING_O.search(term):
+        return [term, term[:-1] + 'ок']
+    if _FLEETING_E.search(term):
+        return [term, term[:-2] + 'ек']
+    return [term]
+
+
+def tokenize(text):
+    return [token.lower() for token in TOKEN_RE.findall(text or '') if len(token) > 1 or token.isdigit()]
+
+
+def uses_postgres():
+    return connection.vendor == 'postgresql'
+
+
+def product_terms(product):
+    """Основы слов товара с весами для инвертированного индекса"""
+    weights = {}
+    for text, weight in ((product.name, NAME_WEIGHT), (product.description, DESCRIPTION_WEIGHT)):
+        for token in tokenize(text):
+            term = stem(token)[:64]
+            weights[term] = weights.get(term, 0) + weight
+    return weights
+
+
+def update_search_index(product):
+    """Обновить поисковый индекс одного товара после сохранения"""
+    from .models import Product, SearchTerm
+
+    if uses_postgres():
+        Product.objects.filter(pk=product.pk).update(search_vector=_postgres_vector())
+        return
+
+    SearchTerm.objects.filter(product=product).delete()
+    SearchTerm.objects.bulk_create(
+        SearchTerm(product=product, term=term, weight=weight)
+        for term, weight in product_terms(product).items()
+    )
+
+
+def rebuild_search_index(batch_size=1000, stdout=None):
+    """Переиндексировать все товары пачками по первичному ключу"""
+    from .models import Product, SearchTerm
+
+    last_id = 0
+    indexed = 0
+    while True:
+        ids = list(
+            Product.objects.filter(id__gt=last_id)
+            .order_by('id')
+            .values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            break
+
+        if uses_postgres():
+            Product.objects.filter(id__in=ids).update(search_vector=_postgres_vector())
+        else:
+            products = Product.objects.filter(id__in=ids).only('id', 'name', 'description')
+            SearchTerm.objects.filter(product_id__in=ids).delete()
+            SearchTerm.objects.bulk_create(
+                [
+                    SearchTerm(product=product, term=term, weight=weight)
+                    for product in products
+                    for term, weight in product_terms(product).items()
+                ],
+                batch_size=batch_size,
+            )
+
+        last_id = ids[-1]
+        indexed += len(ids)
+        if stdout is not None:
+            stdout.write(f'Проиндексировано товаров: {indexed}')
+    return indexed
+
+
+def search_products(queryset, query):
+    """Отфильтровать товары по запросу и добавить аннотацию ``search_rank``.
+
+    Последнее слово запроса ищется по префиксу, чтобы поиск работал
+    по мере набора текста.
+    """
+    tokens = tokenize(query)
+    if not tokens:
+        return queryset.none()
+
+    if uses_postgres():
+        from django.contrib.postgres.search import SearchQuery, SearchRank
+
+        words = []
+        for index, token in enumerate(tokens):
+            suffix = ':*' if index == len(tokens) - 1 else ''
+            # Формы с беглой гласной стемминг PostgreSQL тоже не сводит
+            variants = [token, *stem_variants(stem(token))[1:]]
+            words.append('(' + ' | '.join(f'{word}{suffix}' for word in variants) + ')')
+        raw_query = ' & '.join(words)
+        search_query = SearchQuery(raw_query, config=SEARCH_CONFIG, search_type='raw')
+        return queryset.filter(search_vector=search_query).annotate(
+            search_rank=Cast(
+                SearchRank(F('search_vector'), search_query) * RANK_PRECISION,
+                output_field=IntegerField(),
+            )
+        )
+
+    from .models import SearchTerm
+
+    matches = Q()
+    for token in tokens:
+        term_matches = Q()
+        for term in stem_variants(stem(token)):
+            term_matches |= Q(term__startswith=term)
+        matches |= term_matches
+        queryset = queryset.filter(Exists(
+            SearchTerm.objects.filter(term_matches, product=OuterRef('pk'))
+        ))
+
+    rank = (
+        SearchTerm.objects.filter(matches, product=OuterRef('pk'))
+        .values('product')
+        .annotate(total=Sum('weight'))
+        .values('total')
+    )
+    return queryset.annotate(
+        search_rank=Coalesce(Subquery(rank, output_field=IntegerField()), 0)
+    )
+
+
+def _postgres_vector():
+    from django.contrib.postgres.search import SearchVector
+
+    return (
+        SearchVector('name', weight='A', config=SEARCH_CONFIG)
+        + SearchVector('description', weight='B', config=SEARCH_CONFIG)
+    )
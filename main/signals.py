@@ -0,0 +1,37 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .duplicates import fingerprint_image
+from .facets import invalidate_facet_counts
+from .models import ImageFingerprint, Product, ProductImage, ProductSize
+
+
+@receiver([post_save, post_delete], sender=Product)
+@receiver([post_save, post_delete], sender=ProductSize)
+@receiver([post_save, post_delete], sender='moderator.ProductModeration')
+def reset_facet_counts(sender, **kwargs):
+    invalidate_facet_counts()
+
+
+@receiver(post_save, sender=Product)
+def fingerprint_main_image(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields is not None and 'main_image' not in update_fields):
+        return
+    # Сохранения модерации, остатков и т. п. изображение не меняют
+    if instance.main_image.name == getattr(instance, '_loaded_main_image', None):
+        return
+    fingerprint_image(instance, instance.main_image, is_main=True)
+    instance._loaded_main_image = instance.main_image.name
+
+
+@receiver(post_save, sender=ProductImage)
+def fingerprint_extra_image(sender, instance, raw=False, **kwargs):
+    if not raw:
+        fingerprint_image(instance.product, instance.image)
+
+
+@receiver(post_delete, sender=ProductImage)
+def forget_extra_image(sender, instance, **kwargs):
+    ImageFingerprint.objects.filter(
+        product_id=instance.product_id, image=instance.image.name, is_main=False
+    ).delete()
@@ -0,0 +1,82 @@
+"""Выдача уникальных slug для товаров и статей блога.
+
+Номера занятых вариантов вида ``base`` и ``base-N`` читаются одним
+запросом, новый slug получает первый свободный номер. При
+параллельном создании одинаковых названий выигрывает одна вставка, а
+остальные повторяют выбор (уникальный индекс — последняя проверка).
+"""
+import re
+import uuid
+
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.db.models.functions import Substr
+from django.utils.text import slugify
+
+try:
+    from unidecode import unidecode
+    HAS_UNIDECODE = True
+except ImportError:
+    HAS_UNIDECODE = False
+
+
+SLUG_ATTEMPTS = 5
+# Запас длины под суффикс вида «-123»
+SUFFIX_RESERVE = 8
+
+
+def base_slug(text, fallback_prefix, max_length):
+    if HAS_UNIDECODE:
+        text = unidecode(text)
+    slug = slugify(text)[:max_length - SUFFIX_RESERVE].strip('-')
+    return slug or f'{fallback_prefix}-{uuid.uuid4().hex[:8]}'
+
+
+def next_free_slug(model, base, field='slug'):
+    """Первый незанятый slug: base или base-N с наименьшим свободным N"""
+    # Только сам base и base-N: «iphone-pro-max» для base «iphone» не нужен.
+    # Из строк читается лишь суффикс после «base-» (для base — пустая строка)
+    suffixes = model._default_manager.filter(
+        Q(**{field: base}) | Q(**{f'{field}__regex': rf'^{re.escape(base)}-[0-9]+$'})
+    ).values_list(Substr(field, len(base) + 2), flat=True)
+
+    used = set()
+    base_taken = False
+    for suffix in suffixes:
+        if suffix:
+            used.add(int(suffix))
+        else:
+            base_taken = True
+
+    if not base_taken:
+        return base
+    number = 1
+    while number in used:
+        number += 1
+    return f'{base}-{number}'
+
+
+def save_with_slug(instance, text, fallback_prefix, save, field='slug'):
+    """Сохранить объект, выдав ему slug, если его еще нет.
+
+    save — функция, выполняющая сохранение (обычно super().save). Если
+    выбранный slug успели занять, сохранение повторяется с новым.
+    """
+    if getattr(instance, field):
+        return save()
+
+    max_length = instance._meta.get_field(field).max_length
+    base = base_slug(text, fallback_prefix, max_length)
+    model = type(instance)
+    for attempt in range(SLUG_ATTEMPTS):
+        setattr(instance, field, next_free_slug(model, base, field))
+        try:
+            with transaction.atomic():
+                return save()
+        except IntegrityError:
+            slug_taken = model._default_manager.filter(
+                **{field: getattr(instance, field)}
+            ).exists()
+            if attempt == SLUG_ATTEMPTS - 1 or not slug_taken:
+                setattr(instance, field, '')
+                raise
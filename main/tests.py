@@ -1,3 +1,206 @@
+import base64
+import datetime
+import json
+from unittest import mock
+
+from django.db import connection
+from django.db.models import IntegerField, Value
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from .duplicates import hash_bands, possible_duplicates, to_signed
+from .facets import compute_facet_counts
+from .models import Category, ImageFingerprint, Product, SearchTerm
+from .pagination import KeysetPaginator
+from .search import rebuild_search_index, search_products
+from .slugs import next_free_slug
+from .views import CatalogView
+
+
+class KeysetPaginatorTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Обувь')
+        base = timezone.now().replace(microsecond=0)
+        cls.products = []
+        # Все товары созданы в пределах одной миллисекунды
+        for number in range(7):
+            product = Product.objects.create(name=f'Товар {number}', category=category)
+            Product.objects.filter(pk=product.pk).update(
+                created_at=base + datetime.timedelta(microseconds=100 * number + 1)
+            )
+            cls.products.append(product)
+
+    def collect(self, per_page):
+        paginator = KeysetPaginator(Product.objects.all(), per_page=per_page)
+        seen = []
+        cursor = None
+        while True:
+            page = paginator.get_page(cursor)
+            seen.extend(product.pk for product in page)
+            if not page.has_next:
+                return seen
+            cursor = page.next_cursor
+
+    def test_sub_millisecond_boundaries(self):
+        expected = [product.pk for product in reversed(self.products)]
+        for per_page in (1, 2, 3):
+            with self.subTest(per_page=per_page):
+                self.assertEqual(self.collect(per_page), expected)
+
+    def test_cursor_keeps_microseconds(self):
+        paginator = KeysetPaginator(Product.objects.all(), per_page=1)
+        page = paginator.get_page()
+        created_at, _ = paginator.decode_cursor(page.next_cursor)
+        self.assertEqual(created_at, Product.objects.get(pk=page.object_list[0].pk).created_at)
+
+    def test_tampered_cursor_falls_back_to_first_page(self):
+        paginator = KeysetPaginator(Product.objects.all(), per_page=2)
+        first_page = [product.pk for product in paginator.get_page()]
+        for values in ([None, None], [1.5, 2], [{}, 1], ['2024-01-01', []], [True, 1], 'x'):
+            with self.subTest(values=values):
+                cursor = base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+                self.assertIsNone(paginator.decode_cursor(cursor))
+                self.assertEqual([product.pk for product in paginator.get_page(cursor)], first_page)
+
+    def test_annotation_values_are_typed(self):
+        products = Product.objects.annotate(rank=Value(1, output_field=IntegerField()))
+        paginator = KeysetPaginator(products, ordering=('-rank', '-id'))
+        cursor = base64.urlsafe_b64encode(json.dumps(['1', 5]).encode()).decode()
+
+        self.assertEqual(paginator.decode_cursor(cursor), [1, 5])
+        cursor = base64.urlsafe_b64encode(json.dumps(['высокий', 5]).encode()).decode()
+        self.assertIsNone(paginator.decode_cursor(cursor))
+
+
+class SearchTests(TestCase):
+    """Поиск через SearchTerm (вариант для СУБД без tsvector)"""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Обувь')
+        cls.in_name = Product.objects.create(name='Пара белых кроссовок', category=category)
+        cls.in_description = Product.objects.create(
+            name='Кеды', description='Удобные, как кроссовки', category=category
+        )
+        cls.other = Product.objects.create(name='Сумка', description='Кожаная', category=category)
+
+    def search(self, query):
+        products = search_products(Product.objects.all(), query)
+        return [product.pk for product in products.order_by('-search_rank', 'id')]
+
+    def test_stemming_and_name_rank(self):
+        self.assertEqual(self.search('кроссовки'), [self.in_name.pk, self.in_description.pk])
+
+    def test_last_word_matches_by_prefix(self):
+        self.assertEqual(self.search('кожан'), [self.other.pk])
+        self.assertEqual(self.search('белые крос'), [self.in_name.pk])
+        self.assertEqual(self.search('белые сум'), [])
+
+    def test_rebuild_restores_index(self):
+        SearchTerm.objects.all().delete()
+        self.assertEqual(rebuild_search_index(batch_size=2), 3)
+        self.assertEqual(self.search('кроссовки'), [self.in_name.pk, self.in_description.pk])
+
+
+class FacetCountTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.shoes = Category.objects.create(name='Обувь', slug='shoes')
+        cls.bags = Category.objects.create(name='Сумки', slug='bags')
+        for category, condition, brand in [
+            (cls.shoes, 'new', 'Nike'),
+            (cls.shoes, 'good', 'Adidas'),
+            (cls.bags, 'new', 'Nike'),
+        ]:
+            Product.objects.create(name='Товар', category=category, condition=condition,
+                                   brand=brand, total_stock=0, is_approved=True)
+
+    def test_dimension_ignores_own_filter(self):
+        filters = {
+            'category': (lambda queryset, value: queryset.filter(category__slug=value), 'shoes'),
+            'condition': (lambda queryset, value: queryset.filter(condition=value), 'new'),
+        }
+        with self.assertNumQueries(1):
+            counts = compute_facet_counts(Product.objects.all(), filters)
+        self.assertEqual(counts['category'], {'shoes': 1, 'bags': 1})
+        self.assertEqual(counts['condition'], {'new': 1, 'good': 1})
+        self.assertEqual(counts['brand'], [('Nike', 1)])
+
+    def test_brand_limit_is_applied_in_query(self):
+        Product.objects.create(name='Товар', category=self.bags, brand='Puma',
+                               total_stock=0, is_approved=True)
+        with mock.patch('main.facets.BRAND_FACET_LIMIT', 2), self.assertNumQueries(1):
+            counts = compute_facet_counts(Product.objects.all(), {})
+        self.assertEqual(counts['brand'], [('Nike', 2), ('Adidas', 1)])
+
+
+class FacetFilterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Обувь')
+        for color in ('Синий', 'Темно-синий', ' СИНИЙ  металлик', 'Красный'):
+            Product.objects.create(name='Товар', category=category, color=color)
+
+    def test_color_matches_substring_of_normalized_value(self):
+        products = CatalogView.FILTER_MAPPING['color'](Product.objects.all(), 'синий')
+        self.assertEqual(sorted(products.values_list('color', flat=True)),
+                         [' СИНИЙ  металлик', 'Синий', 'Темно-синий'])
+
+
+class SlugTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Телефоны')
+        for slug in ('iphone', 'iphone-2', 'iphone-pro-max', 'iphone-pro-max-1', 'iphone-3x'):
+            Product.objects.create(name='iPhone', slug=slug, category=cls.category)
+
+    def test_first_free_number_ignores_longer_names(self):
+        self.assertEqual(next_free_slug(Product, 'iphone'), 'iphone-1')
+        self.assertEqual(next_free_slug(Product, 'ipho'), 'ipho')
+
+    def test_new_products_get_numbered_slugs(self):
+        slugs = [Product.objects.create(name='iPhone', category=self.category).slug for _ in range(2)]
+        self.assertEqual(slugs, ['iphone-1', 'iphone-3'])
+
+
+class DuplicateTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Обувь')
+        cls.products = [Product.objects.create(name=f'Товар {number}', category=category)
+                        for number in range(3)]
+
+    def add_fingerprint(self, product, value, image='products/main/photo.jpg', is_main=True):
+        bands = hash_bands(value)
+        return ImageFingerprint.objects.create(
+            product=product, image=image, is_main=is_main, hash=to_signed(value),
+            **{f'band_{band}': bands[band] for band in range(len(bands))},
+        )
+
+    def test_background_bands_do_not_match(self):
+        # Общие только нулевые полосы фона, остальные отличаются сильно
+        self.add_fingerprint(self.products[0], 0x1234_5678_0000_0000)
+        self.add_fingerprint(self.products[1], 0x9ABC_DEF0_0000_0000)
+        self.add_fingerprint(self.products[2], 0x1234_5678_0000_0001)
+
+        self.assertEqual(possible_duplicates(self.products[0]), [(self.products[2], 1)])
+
+    def test_cleared_main_image_forgets_hash(self):
+        self.add_fingerprint(self.products[0], 0x1234_5678_9ABC_DEF0)
+        Product.objects.filter(pk=self.products[0].pk).update(main_image='products/main/photo.jpg')
+        product = Product.objects.get(pk=self.products[0].pk)
+        product.main_image = ''
+        product.save()
+
+        self.assertFalse(ImageFingerprint.objects.filter(product=product).exists())
+
+    def test_save_without_image_change_skips_fingerprinting(self):
+        Product.objects.filter(pk=self.products[0].pk).update(main_image='products/main/photo.jpg')
+        product = Product.objects.get(pk=self.products[0].pk)
+        product.total_stock = 3
+        with CaptureQueriesContext(connection) as queries:
+            product.save()
 
-# Create your tests here.
+        self.assertFalse(any('main_imagefingerprint' in query['sql'] for query in queries.captured_queries))
@@ -2,12 +2,15 @@ from django.shortcuts import get_object_or_404, redirect
 from django.views.generic import TemplateView, DetailView, FormView
 from django.http import HttpResponse
 from django.template.response import TemplateResponse
-from .models import Category, Product, Size, BlogPost
+from .models import Category, Product, Size, BlogPost, normalize_facet
 from .forms import ContactForm
 from django.db.models import Q
-from moderator.models import ModerationStatus
 from django.contrib import messages
 from django.core.paginator import Paginator
+from .pagination import KeysetPaginator
+from .search import search_products
+from .facets import get_facet_counts
+from cart.reservations import with_available_stock
 
 
 class IndexView(TemplateView):
@@ -29,12 +32,13 @@ class IndexView(TemplateView):
 
 class CatalogView(TemplateView):
     template_name = 'main/base.html'
+    paginate_by = 24
 
     FILTER_MAPPING = {
-        'color': lambda queryset, value: queryset.filter(color__icontains=value),
+        'color': lambda queryset, value: queryset.filter(color_key__contains=normalize_facet(value)),
         'size': lambda queryset, value: queryset.filter(product_sizes__size__name=value),
-        'material': lambda queryset, value: queryset.filter(material__icontains=value),
-        'brand': lambda queryset, value: queryset.filter(brand__icontains=value),
+        'material': lambda queryset, value: queryset.filter(material_key__contains=normalize_facet(value)),
+        'brand': lambda queryset, value: queryset.filter(brand_key__contains=normalize_facet(value)),
         'condition': lambda queryset, value: queryset.filter(condition=value),
         'category': lambda queryset, value: queryset.filter(category__slug=value),
     }
@@ -46,7 +50,7 @@ class CatalogView(TemplateView):
         
         products = Product.objects.filter(
             is_active=True,
-            moderation__status=ModerationStatus.APPROVED
+            is_approved=True
         ).order_by('-created_at')
         
         current_category = None
@@ -54,32 +58,56 @@ class CatalogView(TemplateView):
 
         if category_slug:
             current_category = get_object_or_404(Category, slug=category_slug)
-            products = products.filter(category=current_category)
             current_category_name = current_category.name
 
+        ordering = ('-created_at', '-id')
         query = self.request.GET.get('q')
         if query:
-            products = products.filter(
-                Q(name__icontains=query) | Q(description__icontains=query)
+            products = search_products(products, query)
+            ordering = ('-search_rank', '-created_at', '-id')
+
+        # Фильтры собираются отдельно: счетчики фильтров считаются по
+        # каждому измерению без его собственного фильтра
+        applied_filters = {}
+        if current_category:
+            applied_filters['category'] = (
+                lambda queryset, value: queryset.filter(category=value), current_category
             )
 
         filter_params = {}
         for param, filter_func in self.FILTER_MAPPING.items():
             value = self.request.GET.get(param)
             if value:
+                filter_params[param] = value
                 if param == 'category' and category_slug:
-                    filter_params[param] = value
                     continue
-                products = filter_func(products, value)
-                filter_params[param] = value
+                applied_filters[param] = (filter_func, value)
             else:
                 filter_params[param] = ''
 
+        unfiltered_products = products
+        for filter_func, value in applied_filters.values():
+            products = filter_func(products, value)
+
         filter_params['q'] = query or ''
 
+        cursor = self.request.GET.get('cursor')
+        page = KeysetPaginator(
+            products, ordering=ordering, per_page=self.paginate_by
+        ).get_page(cursor)
+
+        next_page_url = None
+        if page.has_next:
+            params = self.request.GET.copy()
+            params.pop('show_filters', None)
+            params['cursor'] = page.next_cursor
+            next_page_url = f'{self.request.path}?{params.urlencode()}'
+
         context.update({
             'categories': categories,
-            'products': products,
+            'products': page,
+            'next_page_url': next_page_url,
+            'is_next_page': bool(cursor),
             'current_category': category_slug,
             'current_category_name': current_category_name,
             'filter_params': filter_params,
@@ -87,6 +115,29 @@ class CatalogView(TemplateView):
             'search_query': query or ''
         })
 
+        if self.request.GET.get('show_filters') == 'true':
+            facets = get_facet_counts(
+                unfiltered_products, applied_filters, {'category_slug': category_slug, **filter_params}
+            )
+            for category in categories:
+                category.product_count = facets['category'].get(category.slug, 0)
+            sizes = list(Size.objects.all())
+            for size in sizes:
+                size.product_count = facets['size'].get(size.name, 0)
+            context.update({
+                'sizes': sizes,
+                'conditions': [
+                    (value, label, facets['condition'].get(value, 0))
+                    for value, label in Product._meta.get_field('condition').choices
+                ],
+                'brand_facets': facets['brand'],
+            })
+
+        # Общее количество нужно только для первой страницы, и считается
+        # отдельным COUNT без сортировки вместо загрузки всех строк
+        if not cursor and self.request.GET.get('show_filters') != 'true':
+            context['products_count'] = products.order_by().count()
+
         if self.request.GET.get('show_search') == 'true':
             context['show_search'] = True
         elif self.request.GET.get('reset_search') == 'true':
@@ -101,6 +152,8 @@ class CatalogView(TemplateView):
                 return TemplateResponse(request, 'main/search_input.html', context)
             elif context.get('reset_search'):
                 return TemplateResponse(request, 'main/search_button.html', {})
+            if context['is_next_page']:
+                return TemplateResponse(request, 'main/partials/product_page.html', context)
             template = 'main/filter_modal.html' if request.GET.get('show_filters') == 'true' else (
                 'main/main_catalog_content.html' if not context['current_category'] else 'main/catalog_content.html'
             )
@@ -121,12 +174,17 @@ class ProductDetailView(DetailView):
         context = super().get_context_data(**kwargs)
         product = self.get_object()
         context['categories'] = Category.objects.all()
+        # Свободный остаток с учетом резервов в чужих корзинах
+        context['product_sizes'] = with_available_stock(
+            product.product_sizes.select_related('size'),
+            exclude_key=self.request.cart.existing_reservation_key,
+        )
         
         related_products = Product.objects.filter(
             category=product.category,
             is_active=True,
-            moderation__status=ModerationStatus.APPROVED
-        ).exclude(id=product.id)[:4]
+            is_approved=True
+        ).exclude(id=product.id).order_by('-created_at', '-id')[:4]
         
         context['related_products'] = related_products
         context['current_category'] = product.category.slug
@@ -1,11 +1,34 @@
 from django.contrib import admin
-from .models import ProductModeration
+from django.utils import timezone
+from main.models import Product
+from .models import ProductModeration, ModerationStatus
 
 
 @admin.register(ProductModeration)
 class ProductModerationAdmin(admin.ModelAdmin):
-    list_display = ('product', 'status', 'moderator', 'created_at', 'moderated_at')
+    list_display = ('product', 'status', 'moderator', 'claimed_by', 'created_at', 'moderated_at')
     list_filter = ('status', 'created_at', 'moderated_at')
     search_fields = ('product__name', 'moderator__email')
-    raw_id_fields = ('product', 'moderator')
+    raw_id_fields = ('product', 'moderator', 'claimed_by')
     readonly_fields = ('created_at',)
+    actions = ('approve_selected', 'reject_selected')
+
+    def save_model(self, request, obj, form, change):
+        # Очереди одобренных и отклоненных сортируются по moderated_at
+        if obj.status != ModerationStatus.PENDING and obj.moderated_at is None:
+            obj.moderated_at = timezone.now()
+        super().save_model(request, obj, form, change)
+        # Держим копию статуса на товаре в актуальном состоянии
+        Product.objects.filter(pk=obj.product_id).update(
+            is_approved=obj.status == ModerationStatus.APPROVED
+        )
+
+    @admin.action(description='Одобрить выбранные объявления')
+    def approve_selected(self, request, queryset):
+        done = queryset.approve(request.user)
+        self.message_user(request, f'Одобрено объявлений: {len(done)}')
+
+    @admin.action(description='Отклонить выбранные объявления')
+    def reject_selected(self, request, queryset):
+        done = queryset.reject(request.user)
+        self.message_user(request, f'Отклонено объявлений: {len(done)}')
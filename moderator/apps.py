@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class ModeratorConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'moderator'
+
+    def ready(self):
+        from . import signals  # noqa: F401
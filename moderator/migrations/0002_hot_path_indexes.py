@@ -0,0 +1,24 @@
+# Generated by Django 5.2.7 on 2026-10-18 05:30
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0010_hot_path_indexes'),
+        ('moderator', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='productmoderation',
+            index=models.Index(fields=['status', '-created_at'], name='moderation_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productmoderation',
+            index=models.Index(fields=['status', '-moderated_at'], name='moderation_status_moder_idx'),
+        ),
+    ]
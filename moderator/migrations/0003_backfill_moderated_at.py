@@ -0,0 +1,22 @@
+from django.db import migrations
+from django.db.models import F
+
+
+def backfill_moderated_at(apps, schema_editor):
+    # Очереди одобренных и отклоненных постранично сортируются по
+    # moderated_at, поэтому у обработанных записей оно должно быть заполнено
+    ProductModeration = apps.get_model('moderator', 'ProductModeration')
+    ProductModeration.objects.filter(moderated_at__isnull=True).exclude(
+        status='pending'
+    ).update(moderated_at=F('created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('moderator', '0002_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_moderated_at, migrations.RunPython.noop),
+    ]
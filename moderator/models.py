@@ -1,5 +1,10 @@
-from django.db import models
+from datetime import timedelta
+
+from django.db import models, transaction
+from django.db.models import Case, Q, Value, When
 from django.conf import settings
+from django.utils import timezone
+from main.facets import invalidate_facet_counts
 from main.models import Product
 
 
@@ -9,6 +14,93 @@ class ModerationStatus(models.TextChoices):
     REJECTED = 'rejected', 'Отклонено'
 
 
+# Сколько объявление остается закрепленным за модератором после захвата
+CLAIM_LEASE = timedelta(minutes=15)
+
+
+class ProductModerationQuerySet(models.QuerySet):
+    def available_to(self, moderator, now=None):
+        """Записи, не захваченные другими модераторами (или с истекшим захватом)"""
+        now = now or timezone.now()
+        return self.filter(
+            Q(claim_expires_at__isnull=True) | Q(claim_expires_at__lte=now) | Q(claimed_by=moderator)
+        )
+
+    def claim(self, moderator, limit, lease=CLAIM_LEASE):
+        """Закрепить за модератором до limit самых старых ожидающих записей.
+
+        Строки, которые в этот момент захватывает другой модератор,
+        пропускаются (SKIP LOCKED), поэтому параллельные захваты не ждут
+        друг друга и не получают одни и те же объявления. Свои незавершенные
+        захваты продлеваются. Возвращает id захваченных записей.
+        """
+        now = timezone.now()
+        with transaction.atomic():
+            ids = list(
+                self.filter(status=ModerationStatus.PENDING)
+                .available_to(moderator, now)
+                .order_by('created_at', 'id')
+                .select_for_update(skip_locked=True)
+                .values_list('id', flat=True)[:limit]
+            )
+            ProductModeration.objects.filter(id__in=ids).update(
+                claimed_by=moderator, claim_expires_at=now + lease
+            )
+        return ids
+
+    def release(self, moderator):
+        """Снять захваты модератора"""
+        return self.filter(claimed_by=moderator).update(claimed_by=None, claim_expires_at=None)
+
+    def _moderate(self, status, moderator, **fields):
+        """Перевести ожидающие записи в status набором UPDATE.
+
+        Записи, захваченные другим модератором, пропускаются. update() не
+        вызывает сигналы, поэтому кэши фильтров каталога и
+        статистики модератора сбрасываются здесь же, после коммита.
+        """
+        from .stats import invalidate_dashboard_stats
+
+        with transaction.atomic():
+            product_ids = list(
+                self.filter(status=ModerationStatus.PENDING)
+                .available_to(moderator)
+                .select_for_update()
+                .values_list('product_id', flat=True)
+            )
+            if not product_ids:
+                return []
+
+            ProductModeration.objects.filter(product_id__in=product_ids).update(
+                status=status,
+                moderator=moderator,
+                moderated_at=timezone.now(),
+                claimed_by=None,
+                claim_expires_at=None,
+                **fields,
+            )
+            if status == ModerationStatus.APPROVED:
+                # Публикуются только товары с ненулевым остатком
+                Product.objects.filter(id__in=product_ids).update(
+                    is_approved=True,
+                    is_active=Case(When(total_stock__gt=0, then=Value(True)), default=Value(False)),
+                )
+            else:
+                Product.objects.filter(id__in=product_ids).update(is_approved=False, is_active=False)
+
+            transaction.on_commit(invalidate_facet_counts)
+            transaction.on_commit(invalidate_dashboard_stats)
+        return product_ids
+
+    def approve(self, moderator):
+        """Одобрить ожидающие объявления, вернуть id обработанных товаров"""
+        return self._moderate(ModerationStatus.APPROVED, moderator)
+
+    def reject(self, moderator, reason=''):
+        """Отклонить ожидающие объявления, вернуть id обработанных товаров"""
+        return self._moderate(ModerationStatus.REJECTED, moderator, rejection_reason=reason)
+
+
 class ProductModeration(models.Model):
     """Модель для отслеживания статуса модерации объявлений"""
     product = models.OneToOneField(Product, on_delete=models.CASCADE, related_name='moderation')
@@ -27,11 +119,35 @@ class ProductModeration(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     moderated_at = models.DateTimeField(null=True, blank=True)
     rejection_reason = models.TextField(blank=True, null=True)
+    claimed_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='claimed_moderations'
+    )
+    claim_expires_at = models.DateTimeField(null=True, blank=True)
+
+    objects = ProductModerationQuerySet.as_manager()
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', '-created_at'], name='moderation_status_created_idx'),
+            models.Index(fields=['status', '-moderated_at'], name='moderation_status_moder_idx'),
+        ]
         verbose_name = 'Модерация объявления'
         verbose_name_plural = 'Модерация объявлений'
 
     def __str__(self):
         return f"{self.product.name} - {self.get_status_display()}"
+
+    def is_claimed_by_other(self, moderator, now=None):
+        """Запись захвачена другим модератором, и захват еще не истек"""
+        now = now or timezone.now()
+        return (
+            self.claimed_by_id is not None
+            and self.claimed_by_id != moderator.pk
+            and self.claim_expires_at is not None
+            and self.claim_expires_at > now
+        )
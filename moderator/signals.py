@@ -0,0 +1,11 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import ProductModeration
+from .stats import invalidate_dashboard_stats
+
+
+@receiver([post_save, post_delete], sender=ProductModeration)
+def reset_dashboard_stats(sender, **kwargs):
+    transaction.on_commit(invalidate_dashboard_stats)
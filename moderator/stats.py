@@ -0,0 +1,95 @@
+"""Статистика панели модератора.
+
+Количество объявлений по статусам и показатели пропускной способности
+считаются одним агрегирующим запросом. Результат кэшируется и
+сбрасывается при любом изменении модерации (см. moderator.signals).
+"""
+import statistics
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Aggregate, Count, DurationField, ExpressionWrapper, F, FloatField, Q
+from django.utils import timezone
+
+from .models import ModerationStatus, ProductModeration
+
+
+DASHBOARD_STATS_KEY = 'moderator:dashboard_stats'
+DASHBOARD_STATS_TIMEOUT = 60
+# За какой период считается медианное время модерации
+MEDIAN_WINDOW = timedelta(days=7)
+
+
+class MedianSeconds(Aggregate):
+    """Медиана интервала в секундах (только PostgreSQL)"""
+    function = 'percentile_cont'
+    template = '%(function)s(0.5) WITHIN GROUP (ORDER BY EXTRACT(EPOCH FROM %(expressions)s))'
+    output_field = FloatField()
+
+
+def _moderation_time():
+    return ExpressionWrapper(F('moderated_at') - F('created_at'), output_field=DurationField())
+
+
+def compute_dashboard_stats():
+    now = timezone.now()
+    median_since = now - MEDIAN_WINDOW
+    recently_moderated = Q(moderated_at__gte=median_since) & ~Q(status=ModerationStatus.PENDING)
+
+    aggregates = {
+        'pending_count': Count('id', filter=Q(status=ModerationStatus.PENDING)),
+        'approved_count': Count('id', filter=Q(status=ModerationStatus.APPROVED)),
+        'rejected_count': Count('id', filter=Q(status=ModerationStatus.REJECTED)),
+        'approved_last_hour': Count('id', filter=Q(
+            status=ModerationStatus.APPROVED, moderated_at__gte=now - timedelta(hours=1)
+        )),
+        'approved_last_day': Count('id', filter=Q(
+            status=ModerationStatus.APPROVED, moderated_at__gte=now - timedelta(days=1)
+        )),
+    }
+    if connection.vendor == 'postgresql':
+        aggregates['median_seconds'] = MedianSeconds(_moderation_time(), filter=recently_moderated)
+
+    stats = ProductModeration.objects.aggregate(**aggregates)
+
+    if 'median_seconds' not in stats:
+        # В остальных СУБД нет percentile_cont, медиану считаем в Python
+        durations = [
+            duration.total_seconds() for duration in
+            ProductModeration.objects.filter(recently_moderated)
+            .annotate(duration=_moderation_time())
+            .values_list('duration', flat=True)
+            if duration is not None
+        ]
+        stats['median_seconds'] = statistics.median(durations) if durations else None
+
+    stats['approvals_per_hour'] = round(stats['approved_last_day'] / 24, 1)
+    return stats
+
+
+def get_dashboard_stats():
+    stats = cache.get(DASHBOARD_STATS_KEY)
+    if stats is None:
+        stats = compute_dashboard_stats()
+        cache.set(DASHBOARD_STATS_KEY, stats, DASHBOARD_STATS_TIMEOUT)
+    return stats
+
+
+def invalidate_dashboard_stats():
+    """Сбросить снимок статистики (вызывается через transaction.on_commit)"""
+    cache.delete(DASHBOARD_STATS_KEY)
+
+
+def format_duration(seconds):
+    """Интервал в виде «2 ч 15 мин»"""
+    if seconds is None:
+        return '—'
+    minutes = int(round(seconds) // 60)
+    hours, minutes = divmod(minutes, 60)
+    days, hours = divmod(hours, 24)
+    if days:
+        return f'{days} д {hours} ч'
+    if hours:
+        return f'{hours} ч {minutes} мин'
+    return f'{minutes} мин'
@@ -1,3 +1,107 @@
+from django.contrib.auth import get_user_model
+from django.contrib.messages import get_messages
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
 
-# Create your tests here.
+from main.models import Category, Product
+from .models import CLAIM_LEASE, ModerationStatus, ProductModeration
+
+
+class ModerationTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        users = get_user_model().objects
+        cls.moderator = users.create_user('mod@example.com', 'Мария', 'Иванова',
+                                          password='x', is_staff=True)
+        category = Category.objects.create(name='Обувь')
+        cls.products = [
+            Product.objects.create(name=f'Товар {number}', category=category, total_stock=1)
+            for number in range(3)
+        ]
+        for product in cls.products:
+            ProductModeration.objects.create(product=product)
+
+    def setUp(self):
+        self.client.force_login(self.moderator)
+
+
+class BulkModerationTests(ModerationTestCase):
+    def test_htmx_response_carries_status(self):
+        response = self.client.post(
+            reverse('moderator:bulk_moderate'),
+            {'action': 'approve', 'product_ids': [self.products[0].id, self.products[1].id]},
+            HTTP_HX_REQUEST='true',
+        )
+
+        self.assertContains(response, 'Одобрено объявлений: 2')
+        self.assertContains(response, f'id="listing-{self.products[0].id}" hx-swap-oob="delete"')
+        self.assertEqual(len(get_messages(response.wsgi_request)), 0)
+        self.assertEqual(
+            ProductModeration.objects.filter(status=ModerationStatus.APPROVED).count(), 2
+        )
+
+    def test_plain_post_redirects_with_message(self):
+        response = self.client.post(
+            reverse('moderator:bulk_moderate'),
+            {'action': 'reject', 'product_ids': [self.products[2].id]},
+        )
+
+        self.assertRedirects(response, reverse('moderator:pending_listings'), fetch_redirect_response=False)
+        self.assertEqual([str(message) for message in get_messages(response.wsgi_request)],
+                         ['Отклонено объявлений: 1'])
+
+
+class ClaimTests(ModerationTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.other = get_user_model().objects.create_user('mod2@example.com', 'Петр', 'Сидоров',
+                                                        password='x', is_staff=True)
+
+    def claim_by_other(self, product, expires_in=CLAIM_LEASE):
+        ProductModeration.objects.filter(product=product).update(
+            claimed_by=self.other, claim_expires_at=timezone.now() + expires_in
+        )
+
+    def test_listing_claimed_by_other_is_not_approved(self):
+        self.claim_by_other(self.products[0])
+        response = self.client.post(
+            reverse('moderator:approve_listing', args=[self.products[0].id]), HTTP_HX_REQUEST='true'
+        )
+
+        self.assertContains(response, 'взято в работу другим модератором')
+        self.assertEqual(ProductModeration.objects.get(product=self.products[0]).status,
+                         ModerationStatus.PENDING)
+
+    def test_expired_claim_does_not_block(self):
+        self.claim_by_other(self.products[0], expires_in=-CLAIM_LEASE)
+        self.client.post(reverse('moderator:reject_listing', args=[self.products[0].id]))
+
+        self.assertEqual(ProductModeration.objects.get(product=self.products[0]).status,
+                         ModerationStatus.REJECTED)
+
+    def test_bulk_skips_listings_claimed_by_other(self):
+        self.claim_by_other(self.products[1])
+        response = self.client.post(
+            reverse('moderator:bulk_moderate'),
+            {'action': 'approve', 'product_ids': [self.products[0].id, self.products[1].id]},
+        )
+
+        self.assertEqual([str(message) for message in get_messages(response.wsgi_request)],
+                         ['Одобрено объявлений: 1, пропущено: 1'])
+        self.assertEqual(ProductModeration.objects.get(product=self.products[1]).status,
+                         ModerationStatus.PENDING)
+
+    def test_claim_skips_listings_claimed_by_other(self):
+        self.claim_by_other(self.products[0])
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('moderator:claim_listings'), HTTP_HX_REQUEST='true')
+
+        # Выбор для захвата и одна выборка захваченных объявлений
+        self.assertEqual(sum('FROM "moderator_productmoderation"' in query['sql']
+                             for query in queries.captured_queries), 2)
+        self.assertEqual([listing.product_id for listing in response.context['listings']],
+                         [self.products[1].id, self.products[2].id])
@@ -10,5 +10,7 @@ urlpatterns = [
     path('rejected/', views.rejected_listings, name='rejected_listings'),
     path('approve/<int:product_id>/', views.approve_listing, name='approve_listing'),
     path('reject/<int:product_id>/', views.reject_listing, name='reject_listing'),
+    path('claim/', views.claim_listings, name='claim_listings'),
+    path('bulk/', views.bulk_moderate, name='bulk_moderate'),
     path('listing/<int:product_id>/', views.listing_detail, name='listing_detail'),
 ]
@@ -6,7 +6,10 @@ from django.urls import reverse
 from django.utils import timezone
 from django.contrib import messages
 from .models import ProductModeration, ModerationStatus
+from .stats import format_duration, get_dashboard_stats
+from main.duplicates import possible_duplicates
 from main.models import Product
+from main.pagination import KeysetPaginator
 
 
 def is_moderator(user):
@@ -18,112 +21,145 @@ def is_moderator(user):
 @user_passes_test(is_moderator)
 def moderator_dashboard(request):
     """Главная страница модератора со статистикой"""
-    pending_count = ProductModeration.objects.filter(status=ModerationStatus.PENDING).count()
-    approved_count = ProductModeration.objects.filter(status=ModerationStatus.APPROVED).count()
-    rejected_count = ProductModeration.objects.filter(status=ModerationStatus.REJECTED).count()
+    stats = get_dashboard_stats()
     
     recent_pending = ProductModeration.objects.filter(
         status=ModerationStatus.PENDING
     ).select_related('product', 'product__owner')[:5]
     
     return TemplateResponse(request, 'moderator/dashboard.html', {
-        'pending_count': pending_count,
-        'approved_count': approved_count,
-        'rejected_count': rejected_count,
+        **stats,
+        'median_moderation_time': format_duration(stats['median_seconds']),
         'recent_pending': recent_pending,
     })
 
 
+QUEUE_PAGE_SIZE = 20
+# Сколько объявлений модератор берет в работу за раз
+CLAIM_BATCH_SIZE = 10
+
+# Очереди модерации: статус, порядок (совпадает с индексами модели) и шаблоны
+QUEUES = {
+    'pending': (ModerationStatus.PENDING, ('-created_at', '-id')),
+    'approved': (ModerationStatus.APPROVED, ('-moderated_at', '-id')),
+    'rejected': (ModerationStatus.REJECTED, ('-moderated_at', '-id')),
+}
+
+
+def queue_response(request, name, cursor=None, extra_context=None):
+    """Страница очереди; с курсором — только строки для подгрузки"""
+    status, ordering = QUEUES[name]
+    queryset = ProductModeration.objects.filter(status=status)
+    if status == ModerationStatus.PENDING:
+        # Объявления, взятые в работу другими модераторами, не показываем
+        queryset = queryset.available_to(request.user)
+    page = KeysetPaginator(
+        queryset.select_related(
+            'product', 'product__owner', 'product__category', 'moderator'
+        ),
+        ordering=ordering,
+        per_page=QUEUE_PAGE_SIZE,
+    ).get_page(cursor)
+
+    next_page_url = None
+    if page.has_next:
+        next_page_url = f"{reverse(f'moderator:{name}_listings')}?cursor={page.next_cursor}"
+
+    context = {
+        'listings': page.object_list,
+        'next_page_url': next_page_url,
+        **(extra_context or {}),
+    }
+    if cursor:
+        return TemplateResponse(request, f'moderator/partials/{name}_rows.html', context)
+    return TemplateResponse(request, f'moderator/partials/{name}_listings.html', context)
+
+
 @login_required
 @user_passes_test(is_moderator)
 def pending_listings(request):
     """Список объявлений на модерации"""
-    listings = ProductModeration.objects.filter(
-        status=ModerationStatus.PENDING
-    ).select_related('product', 'product__owner').order_by('-created_at')
-    
-    if request.headers.get('HX-Request'):
-        return TemplateResponse(request, 'moderator/partials/pending_listings.html', {
-            'listings': listings
-        })
-    
-    return TemplateResponse(request, 'moderator/partials/pending_listings.html', {
-        'listings': listings
-    })
+    return queue_response(request, 'pending', request.GET.get('cursor'))
 
 
 @login_required
 @user_passes_test(is_moderator)
 def approved_listings(request):
     """Список одобренных объявлений"""
-    listings = ProductModeration.objects.filter(
-        status=ModerationStatus.APPROVED
-    ).select_related('product', 'product__owner').order_by('-moderated_at')
-    
-    if request.headers.get('HX-Request'):
-        return TemplateResponse(request, 'moderator/partials/approved_listings.html', {
-            'listings': listings
-        })
-    
-    return TemplateResponse(request, 'moderator/partials/approved_listings.html', {
-        'listings': listings
-    })
+    return queue_response(request, 'approved', request.GET.get('cursor'))
 
 
 @login_required
 @user_passes_test(is_moderator)
 def rejected_listings(request):
     """Список отклоненных объявлений"""
-    listings = ProductModeration.objects.filter(
-        status=ModerationStatus.REJECTED
-    ).select_related('product', 'product__owner').order_by('-moderated_at')
-    
-    if request.headers.get('HX-Request'):
-        return TemplateResponse(request, 'moderator/partials/rejected_listings.html', {
-            'listings': listings
-        })
-    
-    return TemplateResponse(request, 'moderator/partials/rejected_listings.html', {
-        'listings': listings
+    return queue_response(request, 'rejected', request.GET.get('cursor'))
+
+
+def moderation_done(request, product_ids, message, level=messages.SUCCESS):
+    """Ответ на одобрение или отклонение.
+
+    Для HTMX из очереди строки просто удаляются out-of-band, без
+    повторного запроса очереди, а результат показывается в блоке статуса;
+    со страницы деталей возвращаемся к очереди. Без HTMX — сообщение и
+    редирект.
+    """
+    if not request.headers.get('HX-Request'):
+        messages.add_message(request, level, message)
+        return redirect('moderator:pending_listings')
+
+    status = {'status_message': message, 'status_tag': messages.DEFAULT_TAGS[level]}
+    if request.POST.get('next') == 'queue':
+        return queue_response(request, 'pending', extra_context=status)
+    return TemplateResponse(request, 'moderator/partials/moderation_done.html', {
+        'product_ids': product_ids,
+        **status,
     })
 
 
+def claimed_by_other(request, moderation):
+    """Ответ, когда объявление закреплено за другим модератором"""
+    return moderation_done(
+        request, [],
+        f'Объявление "{moderation.product.name}" взято в работу другим модератором',
+        messages.WARNING,
+    )
+
+
 @login_required
 @user_passes_test(is_moderator)
 def approve_listing(request, product_id):
     """Одобрить объявление"""
     moderation = get_object_or_404(
-        ProductModeration,
+        ProductModeration.objects.select_for_update(),
         product_id=product_id,
         status=ModerationStatus.PENDING
     )
+    if moderation.is_claimed_by_other(request.user):
+        return claimed_by_other(request, moderation)
     
     # Обновляем статус модерации
     moderation.status = ModerationStatus.APPROVED
     moderation.moderator = request.user
     moderation.moderated_at = timezone.now()
+    moderation.claimed_by = None
+    moderation.claim_expires_at = None
     moderation.save()
     
     product = moderation.product
+    product.is_approved = True
     if product.total_stock > 0:
         product.is_active = True
         product.save()
-        messages.success(request, f'Объявление "{product.name}" одобрено и опубликовано')
-    else:
-        product.is_active = False
-        product.save()
-        messages.warning(request, f'Объявление "{product.name}" одобрено, но не опубликовано (остаток = 0)')
-    
-    if request.headers.get('HX-Request'):
-        # Возвращаем обновленный список
-        listings = ProductModeration.objects.filter(
-            status=ModerationStatus.PENDING
-        ).select_related('product', 'product__owner').order_by('-created_at')
-        return TemplateResponse(request, 'moderator/partials/pending_listings.html', {
-            'listings': listings
-        })
-    
-    return redirect('moderator:pending_listings')
+        return moderation_done(request, [product_id], f'Объявление "{product.name}" одобрено и опубликовано')
+
+    product.is_active = False
+    product.save()
+    return moderation_done(
+        request, [product_id],
+        f'Объявление "{product.name}" одобрено, но не опубликовано (остаток = 0)',
+        messages.WARNING,
+    )
 
 
 @login_required
@@ -131,10 +167,12 @@ def approve_listing(request, product_id):
 def reject_listing(request, product_id):
     """Отклонить объявление"""
     moderation = get_object_or_404(
-        ProductModeration,
+        ProductModeration.objects.select_for_update(),
         product_id=product_id,
         status=ModerationStatus.PENDING
     )
+    if moderation.is_claimed_by_other(request.user):
+        return claimed_by_other(request, moderation)
     
     rejection_reason = request.POST.get('rejection_reason', '')
     
@@ -142,26 +180,65 @@ def reject_listing(request, product_id):
     moderation.status = ModerationStatus.REJECTED
     moderation.moderator = request.user
     moderation.moderated_at = timezone.now()
+    moderation.claimed_by = None
+    moderation.claim_expires_at = None
     moderation.rejection_reason = rejection_reason
     moderation.save()
     
     # Деактивируем продукт
     product = moderation.product
     product.is_active = False
+    product.is_approved = False
     product.save()
     
-    messages.success(request, f'Объявление "{product.name}" отклонено')
-    
-    if request.headers.get('HX-Request'):
-        # Возвращаем обновленный список
-        listings = ProductModeration.objects.filter(
-            status=ModerationStatus.PENDING
-        ).select_related('product', 'product__owner').order_by('-created_at')
-        return TemplateResponse(request, 'moderator/partials/pending_listings.html', {
-            'listings': listings
-        })
-    
-    return redirect('moderator:pending_listings')
+    return moderation_done(request, [product_id], f'Объявление "{product.name}" отклонено')
+
+
+@login_required
+@user_passes_test(is_moderator)
+def claim_listings(request):
+    """Взять в работу следующую пачку объявлений из очереди"""
+    if request.method != 'POST':
+        return HttpResponse(status=405)
+
+    claimed_ids = ProductModeration.objects.claim(request.user, CLAIM_BATCH_SIZE)
+    listings = list(ProductModeration.objects.filter(id__in=claimed_ids).select_related(
+        'product', 'product__owner', 'product__category', 'moderator'
+    ).order_by('created_at', 'id'))
+
+    return TemplateResponse(request, 'moderator/partials/pending_listings.html', {
+        'listings': listings,
+        'claimed_until': listings[0].claim_expires_at if listings else None,
+        'claimed': True,
+    })
+
+
+@login_required
+@user_passes_test(is_moderator)
+def bulk_moderate(request):
+    """Одобрить или отклонить выбранные объявления одним действием"""
+    if request.method != 'POST':
+        return HttpResponse(status=405)
+
+    product_ids = {int(pk) for pk in request.POST.getlist('product_ids') if pk.isdigit()}
+    action = request.POST.get('action')
+    queryset = ProductModeration.objects.filter(product_id__in=product_ids)
+
+    if action == 'approve':
+        done = queryset.approve(request.user)
+        message = f'Одобрено объявлений: {len(done)}'
+    elif action == 'reject':
+        done = queryset.reject(request.user, request.POST.get('rejection_reason', ''))
+        message = f'Отклонено объявлений: {len(done)}'
+    else:
+        return HttpResponse(status=400)
+
+    skipped = len(product_ids) - len(done)
+    if skipped:
+        # Уже обработаны или захвачены другим модератором
+        message += f', пропущено: {skipped}'
+        return moderation_done(request, done, message, messages.WARNING)
+    return moderation_done(request, done, message)
 
 
 @login_required
@@ -177,4 +254,5 @@ def listing_detail(request, product_id):
     return TemplateResponse(request, 'moderator/partials/listing_detail.html', {
         'moderation': moderation,
         'product': product,
+        'possible_duplicates': possible_duplicates(product),
     })
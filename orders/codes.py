@@ -0,0 +1,52 @@
+"""Выдача 12-значных кодов заказов без проверки занятости.
+
+Номер берется из последовательности PostgreSQL (nextval не участвует в
+транзакциях, поэтому не блокирует параллельные заказы) и переставляется
+шифром Фейстеля над диапазоном 0..10^12-1 с ключом из SECRET_KEY. Разные
+номера дают разные коды, а соседние заказы не получают соседних кодов.
+В остальных СУБД код случайный. В обоих случаях последней защитой
+служит уникальный индекс order_code (см. Order.save).
+"""
+import hashlib
+import hmac
+import secrets
+
+from django.conf import settings
+from django.db import connection
+
+
+ORDER_CODE_SEQUENCE = 'orders_order_code_seq'
+ORDER_CODE_LENGTH = 12
+
+_HALF = 10 ** (ORDER_CODE_LENGTH // 2)
+_ROUNDS = 4
+
+
+def _round_value(round_number, value):
+    digest = hmac.new(
+        settings.SECRET_KEY.encode(),
+        f'order-code:{round_number}:{value}'.encode(),
+        hashlib.sha256,
+    ).digest()
+    return int.from_bytes(digest[:8], 'big') % _HALF
+
+
+def permute_order_number(number):
+    """Взаимно однозначно отобразить номер 0..10^12-1 в код той же длины"""
+    left, right = divmod(number % (_HALF * _HALF), _HALF)
+    for round_number in range(_ROUNDS):
+        left, right = right, (left + _round_value(round_number, right)) % _HALF
+    return f'{left * _HALF + right:0{ORDER_CODE_LENGTH}d}'
+
+
+def next_order_number():
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT nextval(%s)', [ORDER_CODE_SEQUENCE])
+        return cursor.fetchone()[0]
+
+
+def generate_order_code():
+    """Новый код заказа без запросов к таблице заказов"""
+    if connection.vendor == 'postgresql':
+        return permute_order_number(next_order_number())
+    return f'{secrets.randbelow(_HALF * _HALF):0{ORDER_CODE_LENGTH}d}'
@@ -0,0 +1,26 @@
+from django.db import migrations
+
+
+def create_order_code_sequence(apps, schema_editor):
+    # Последовательность нужна только PostgreSQL, в остальных СУБД
+    # коды заказов случайные (см. orders.codes)
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE SEQUENCE IF NOT EXISTS orders_order_code_seq')
+
+
+def drop_order_code_sequence(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP SEQUENCE IF EXISTS orders_order_code_seq')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0005_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_order_code_sequence, drop_order_code_sequence),
+    ]
@@ -1,18 +1,101 @@
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models import Case, F, Value, When
+from django.db.models.functions import Greatest
 from django.conf import settings
 from main.models import Product, ProductSize
-import random
-import string
+from main.facets import invalidate_facet_counts
+from cart.reservations import release, reserved_quantities
+from .codes import generate_order_code
 
 
-def generate_order_code():
-    """Generate a unique 12-digit order code"""
-    while True:
-        code = ''.join(random.choices(string.digits, k=12))
-        # Check if code already exists
-        from orders.models import Order
-        if not Order.objects.filter(order_code=code).exists():
-            return code
+# Сколько раз выдавать новый код, если случайно совпал с существующим
+ORDER_CODE_ATTEMPTS = 5
+
+
+class InsufficientStockError(ValueError):
+    """Товара на складе меньше, чем в корзине"""
+
+
+class OrderManager(models.Manager):
+    def create_from_cart(self, user, cart, **fields):
+        """Оформить заказ по корзине набором запросов, не зависящим от числа позиций.
+
+        Строки ProductSize блокируются в порядке id (чтобы параллельные
+        покупки не приводили к взаимоблокировкам), резервы других корзин
+        вычитаются из доступного остатка, остатки уменьшаются одним
+        UPDATE, позиции заказа создаются bulk_create. Затем блокируются
+        строки товаров (тоже по id), и total_stock уменьшается на сумму
+        купленного, а не пересчитывается по снимку, в котором не видны
+        параллельные покупки других размеров того же товара.
+        """
+        items = list(cart.items.select_related('product', 'product_size__size'))
+
+        with transaction.atomic():
+            quantities = {}
+            product_quantities = {}
+            for item in items:
+                quantities[item.product_size_id] = quantities.get(item.product_size_id, 0) + item.quantity
+                product_id = item.product_size.product_id
+                product_quantities[product_id] = product_quantities.get(product_id, 0) + item.quantity
+
+            locked = ProductSize.objects.select_for_update().filter(
+                id__in=quantities
+            ).order_by('id').values_list('id', 'stock')
+            stock = dict(locked)
+            # Резервы других корзин недоступны, свои превращаются в заказ
+            reserved = reserved_quantities(list(quantities), exclude_key=cart.reservation_key)
+
+            for item in items:
+                available = stock.get(item.product_size_id, 0) - reserved.get(item.product_size_id, 0)
+                if available < quantities[item.product_size_id]:
+                    raise InsufficientStockError(
+                        f"Недостаточно товара '{item.product.name}' размера "
+                        f"'{item.product_size.size.name if item.product_size.size else item.product_size.custom_size}'. "
+                        f"Доступно: {max(available, 0)}, запрошено: {quantities[item.product_size_id]}"
+                    )
+
+            updated = ProductSize.objects.filter(id__in=quantities).update(
+                stock=F('stock') - Case(
+                    *[When(id=size_id, then=Value(quantity)) for size_id, quantity in quantities.items()],
+                    default=Value(0),
+                )
+            )
+            if updated != len(quantities):
+                raise InsufficientStockError('Товар был удален во время оформления заказа')
+
+            order = self.create(user=user, **fields)
+            OrderItem.objects.bulk_create([
+                OrderItem(
+                    order=order,
+                    product=item.product,
+                    size=item.product_size,
+                    quantity=item.quantity,
+                    # У товаров нет цены, фиксируем значение по умолчанию
+                    price=OrderItem._meta.get_field('price').default,
+                )
+                for item in items
+            ])
+
+            list(
+                Product.objects.select_for_update().filter(id__in=product_quantities)
+                .order_by('id').values_list('id', flat=True)
+            )
+            Product.objects.filter(id__in=product_quantities).update(
+                total_stock=Greatest(F('total_stock') - Case(
+                    *[When(id=product_id, then=Value(quantity))
+                      for product_id, quantity in product_quantities.items()],
+                    default=Value(0),
+                ), 0)
+            )
+            Product.objects.filter(
+                id__in=product_quantities, total_stock=0, is_active=True
+            ).update(is_active=False)
+
+            cart.clear()
+            release(cart.reservation_key)
+            transaction.on_commit(invalidate_facet_counts)
+
+        return order
 
 
 class Order(models.Model):
@@ -58,16 +141,36 @@ class Order(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = OrderManager()
+
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='order_user_created_idx'),
+        ]
 
     def __str__(self):
         return f"Заказ #{self.order_code} - {self.first_name} {self.patronymic} {self.last_name}"
 
     def save(self, *args, **kwargs):
-        if not self.order_code:
+        if self.order_code:
+            return super().save(*args, **kwargs)
+
+        # Код выдается без проверки занятости; при редком совпадении
+        # (например, со старыми случайными кодами) вставка повторяется
+        # в точке сохранения с новым кодом
+        for attempt in range(ORDER_CODE_ATTEMPTS):
             self.order_code = generate_order_code()
-        super().save(*args, **kwargs)
+            try:
+                with transaction.atomic():
+                    return super().save(*args, **kwargs)
+            except IntegrityError:
+                if attempt == ORDER_CODE_ATTEMPTS - 1 or not self._order_code_taken():
+                    self.order_code = ''
+                    raise
+
+    def _order_code_taken(self):
+        return Order.objects.filter(order_code=self.order_code).exists()
     
     def get_delivery_address_display_full(self):
         """Get full delivery address text"""
@@ -1,3 +1,133 @@
-from django.test import TestCase
+from datetime import timedelta
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from cart.models import Cart, StockReservation
+from cart.reservations import reserve
+from cart.storage import CART_TOKEN_SESSION_KEY
+from cart.tests import LOCMEM_CACHES
+from main.models import Category, Product, ProductSize, Size
+from .models import InsufficientStockError, Order
+
+
+class CreateFromCartTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
+            'buyer@example.com', 'Иван', 'Петров', password='x'
+        )
+        category = Category.objects.create(name='Обувь')
+        cls.product = Product.objects.create(
+            name='Кроссовки', category=category, total_stock=5, is_approved=True
+        )
+        cls.size_s = ProductSize.objects.create(
+            product=cls.product, size=Size.objects.create(name='S'), stock=2
+        )
+        cls.size_m = ProductSize.objects.create(
+            product=cls.product, size=Size.objects.create(name='M'), stock=3
+        )
+
+    def setUp(self):
+        self.cart = Cart.objects.create(session_key='buyer-session')
+
+    def checkout(self):
+        return Order.objects.create_from_cart(
+            self.user, self.cart, first_name='Иван', last_name='Петров', phone='+70000000000'
+        )
+
+    def assertStock(self, size_s, size_m, total):
+        self.size_s.refresh_from_db()
+        self.size_m.refresh_from_db()
+        self.product.refresh_from_db()
+        self.assertEqual((self.size_s.stock, self.size_m.stock, self.product.total_stock),
+                         (size_s, size_m, total))
+
+    def test_decrements_sizes_and_total(self):
+        self.cart.add_product(self.product, self.size_s, 1)
+        self.cart.add_product(self.product, self.size_m, 2)
+        order = self.checkout()
+
+        self.assertEqual(order.items.count(), 2)
+        self.assertStock(1, 1, 2)
+        self.assertEqual(self.cart.items.count(), 0)
+
+    def test_sizes_of_one_product_in_separate_orders(self):
+        self.cart.add_product(self.product, self.size_s, 2)
+        self.checkout()
+        self.cart.add_product(self.product, self.size_m, 3)
+        self.checkout()
+
+        self.assertStock(0, 0, 0)
+        self.assertFalse(self.product.is_active)
+
+    def test_oversell_is_rejected(self):
+        self.cart.add_product(self.product, self.size_s, 3)
+        with self.assertRaises(InsufficientStockError):
+            self.checkout()
+
+        self.assertStock(2, 3, 5)
+        self.assertFalse(Order.objects.exists())
+
+    def test_other_carts_reservations_are_not_available(self):
+        reserve('cart:other', self.size_s, 2)
+        self.cart.add_product(self.product, self.size_s, 1)
+        with self.assertRaises(InsufficientStockError):
+            self.checkout()
+        self.assertStock(2, 3, 5)
+
+    def test_own_reservation_is_available(self):
+        reserve('cart:other', self.size_s, 1)
+        reserve(self.cart.reservation_key, self.size_s, 1)
+        self.cart.add_product(self.product, self.size_s, 1)
+        self.checkout()
+
+        self.assertStock(1, 3, 4)
+        self.assertFalse(StockReservation.objects.filter(cart_key=self.cart.reservation_key).exists())
+
+    def test_expired_reservations_are_ignored(self):
+        reserve('cart:other', self.size_s, 2)
+        StockReservation.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.cart.add_product(self.product, self.size_s, 2)
+        self.checkout()
+
+        self.assertStock(0, 3, 3)
+
+
+@override_settings(CACHES=LOCMEM_CACHES, CART_ANONYMOUS_STORAGE='cache')
+class CheckoutViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
+            'buyer@example.com', 'Иван', 'Петров', password='x'
+        )
+        cls.product = Product.objects.create(
+            name='Кроссовки', category=Category.objects.create(name='Обувь'),
+            total_stock=3, is_approved=True
+        )
+        cls.size = ProductSize.objects.create(
+            product=cls.product, size=Size.objects.create(name='S'), stock=3
+        )
+
+    def test_cached_cart_is_promoted_before_order(self):
+        self.client.force_login(self.user)
+        # Корзина осталась в кэше, например, с момента до входа
+        session = self.client.session
+        session[CART_TOKEN_SESSION_KEY] = 'token'
+        session.save()
+        caches['carts'].set('cart:token', {self.size.id: {'quantity': 2, 'added_at': timezone.now()}})
+
+        response = self.client.post(reverse('orders:checkout'), {
+            'first_name': 'Иван', 'last_name': 'Петров', 'phone': '+70000000000',
+            'delivery_address': 'address_1', 'group_number': 'И-207',
+        })
+
+        self.assertTrue(response.context['success'])
+        order = Order.objects.get(user=self.user)
+        self.assertEqual([(item.size_id, item.quantity) for item in order.items.all()],
+                         [(self.size.id, 2)])
+        self.assertIsNone(caches['carts'].get('cart:token'))
+        self.assertEqual(Cart.objects.get().item_count, 0)
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 05:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0010_hot_path_indexes'),
+        ('users', '0005_customuser_is_moderator'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='wishlist',
+            index=models.Index(fields=['user', '-added_at'], name='wishlist_user_added_idx'),
+        ),
+    ]
@@ -67,6 +67,9 @@ class Wishlist(models.Model):
     class Meta:
         unique_together = ('user', 'product')
         ordering = ['-added_at']
+        indexes = [
+            models.Index(fields=['user', '-added_at'], name='wishlist_user_added_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.email} - {self.product.name}"
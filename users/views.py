@@ -4,6 +4,7 @@ from django.contrib.auth.decorators import login_required
 from django.urls import reverse
 from django.http import HttpResponse, JsonResponse
 from django.template.response import TemplateResponse
+from django.utils import timezone
 from .forms import CustomUserCreationForm, CustomUserLoginForm, CustomUserUpdateForm, EmailVerificationForm
 from .models import CustomUser, Wishlist
 from django.contrib import messages
@@ -308,6 +309,7 @@ def create_listing_view(request):
             product = form.save(commit=False)
             product.owner = request.user
             product.is_active = False
+            product.is_approved = False
             product.save()
             
             images = request.FILES.getlist('additional_images')[:5]
@@ -388,9 +390,11 @@ def my_listings_view(request):
         except ProductModeration.DoesNotExist:
             ProductModeration.objects.create(
                 product=product,
-                status=ModerationStatus.APPROVED
+                status=ModerationStatus.APPROVED,
+                moderated_at=timezone.now()
             )
             product.is_active = True
+            product.is_approved = True
             product.save()
             approved_listings.append(product)
     
@@ -427,9 +431,11 @@ def delete_listing(request, product_id):
                 except ProductModeration.DoesNotExist:
                     ProductModeration.objects.create(
                         product=prod,
-                        status=ModerationStatus.APPROVED
+                        status=ModerationStatus.APPROVED,
+                        moderated_at=timezone.now()
                     )
                     prod.is_active = True
+                    prod.is_approved = True
                     prod.save()
                     approved_listings.append(prod)
             